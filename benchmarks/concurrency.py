@@ -0,0 +1,112 @@
+"""Stress test for a data folder shared by several processes.
+
+Writer processes load the same tab, record practice on random pieces, change proficiencies, add
+pieces of their own and save, over and over, on either backend:
+
+    python benchmarks/concurrency.py --writers 8 --saves 200
+    python benchmarks/concurrency.py --storage sqlite
+
+Afterwards the tab is loaded once more and checked: its total practice time must be the sum of
+every minute any writer recorded and every added piece must be there. Some writers keep their
+table between saves (like an open window), others reload it every time (like the CLI). Prints the
+results as JSON; the exit code is 1 when anything was lost.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from music_study import PieceStore, ValidationReport, open_storage  # noqa: E402
+
+TAB = 1
+
+
+def writer(folder, backend, number, saves, pieces_per_save, seed):
+    rng = random.Random(seed * 1000 + number)
+    storage = open_storage(TAB, folder, backend)
+    data = PieceStore()
+    storage.load(data, ValidationReport())
+    keep_table = number % 2 == 0
+    minutes = 0
+    added = []
+    refreshed = 0
+    for save in range(saves):
+        if not keep_table:
+            storage = open_storage(TAB, folder, backend)
+            data = PieceStore()
+            storage.load(data, ValidationReport())
+        for _ in range(pieces_per_save):
+            row = rng.randrange(len(data))
+            practiced = rng.randint(1, 30)
+            data.record_practice(row, practiced)
+            minutes += practiced
+            if rng.random() < 0.2:
+                data.set_proficiency(rng.randrange(len(data)), rng.randint(1, 10))
+        if save % 10 == 0:
+            added.append(f"writer_{number}/piece_{save}.pdf")
+            data.append(added[-1])
+        refreshed += bool(storage.save(data))
+    return {"minutes": minutes, "added": added, "refreshed": refreshed}
+
+
+def run_writer(arguments):
+    return writer(*arguments)
+
+
+def seed_tab(folder, backend, pieces):
+    data = PieceStore()
+    storage = open_storage(TAB, folder, backend)
+    storage.load(data, ValidationReport())
+    for i in range(pieces):
+        data.append(f"shared/piece_{i}.pdf")
+    storage.save(data)
+
+
+def run():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--writers", type=int, default=8, help="concurrent writer processes")
+    parser.add_argument("--saves", type=int, default=100, help="saves per writer")
+    parser.add_argument("--pieces-per-save", type=int, default=3, help="practiced pieces between saves")
+    parser.add_argument("--library", type=int, default=1000, help="pieces shared by every writer")
+    parser.add_argument("--storage", choices=["csv", "snapshot", "sqlite"], default="csv")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as folder:
+        seed_tab(folder, args.storage, args.library)
+        jobs = [(folder, args.storage, number, args.saves, args.pieces_per_save, args.seed)
+                for number in range(args.writers)]
+        start = time.perf_counter()
+        # Spawned, so no writer inherits a database connection from this process
+        with multiprocessing.get_context("spawn").Pool(args.writers) as pool:
+            results = pool.map(run_writer, jobs)
+        elapsed = time.perf_counter() - start
+        data = PieceStore()
+        open_storage(TAB, folder, args.storage).load(data, ValidationReport())
+
+    expected_minutes = sum(result["minutes"] for result in results)
+    missing = [name for result in results for name in result["added"] if name not in data]
+    report = {
+        "storage": args.storage,
+        "writers": args.writers,
+        "saves": args.writers * args.saves,
+        "saves_per_s": args.writers * args.saves / elapsed,
+        "refreshed_saves": sum(result["refreshed"] for result in results),
+        "expected_minutes": expected_minutes,
+        "stored_minutes": sum(data.minutes),
+        "missing_pieces": missing,
+        "pieces": len(data),
+    }
+    report["ok"] = report["stored_minutes"] == expected_minutes and not missing
+    print(json.dumps(report, indent=2))
+    return 0 if report["ok"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(run())
@@ -0,0 +1,60 @@
+"""Synthetic piece libraries for the benchmarks."""
+import csv
+import datetime
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from music_study import TABLE_COLUMNS, DATE_FORMAT  # noqa: E402
+
+PROFICIENCY_WEIGHTS = {
+    "uniform": [1] * 10,
+    # most pieces still being learned
+    "beginner": [10, 9, 8, 7, 6, 5, 4, 3, 2, 1],
+    # most pieces already mastered
+    "advanced": [1, 2, 3, 4, 5, 6, 7, 8, 9, 10],
+}
+CORRUPTIONS = [
+    ("Name", lambda rng: f"sheet_{rng.randrange(10 ** 6)}.docx"),
+    ("Total Practice Time (min)", lambda rng: rng.choice(["-5", "abc", ""])),
+    ("Date Added", lambda rng: rng.choice(["31-02-2020", "yesterday", ""])),
+    ("Last Practiced", lambda rng: rng.choice(["2020/01/01", "soon"])),
+    ("Proficiency", lambda rng: rng.choice(["0", "11", "x"])),
+]
+
+
+def generate_rows(count, seed=0, never_ratio=0.2, history_days=365, proficiency="uniform",
+                  corruption_rate=0.0, today=None):
+    rng = random.Random(seed)
+    today = datetime.date.today() if today is None else today
+    weights = PROFICIENCY_WEIGHTS[proficiency]
+    for i in range(count):
+        added = today - datetime.timedelta(days=rng.randrange(history_days + 1))
+        if rng.random() < never_ratio:
+            last_practiced = "Never"
+            minutes = 0
+        else:
+            last_practiced = (added + datetime.timedelta(days=rng.randrange((today - added).days + 1)))\
+                .strftime(DATE_FORMAT)
+            minutes = int(rng.expovariate(1 / 600))
+        row = {
+            "Name": f"/library/folder_{i % 97}/sheet_{i}.{rng.choice(['png', 'jpg', 'pdf'])}",
+            "Total Practice Time (min)": str(minutes),
+            "Date Added": added.strftime(DATE_FORMAT),
+            "Last Practiced": last_practiced,
+            "Proficiency": str(rng.choices(range(1, 11), weights)[0])
+        }
+        if corruption_rate and rng.random() < corruption_rate:
+            column, corrupt = rng.choice(CORRUPTIONS)
+            row[column] = corrupt(rng)
+        yield row
+
+
+def write_library(file_path, count, **options):
+    with open(file_path, "w", newline="") as csv_file:
+        writer = csv.DictWriter(csv_file, fieldnames=TABLE_COLUMNS)
+        writer.writeheader()
+        writer.writerows(generate_rows(count, **options))
+    return file_path
@@ -0,0 +1,107 @@
+"""Startup time and memory of one QWebEngineView per tab versus the shared PdfViewerPool.
+
+Each mode runs in its own process so the measurements do not leak into each other:
+
+    python benchmarks/pdf_viewer.py --tabs 20
+
+"per-tab" reproduces the previous behaviour (every Tab creates and loads its own view),
+"pooled" creates the same tabs and borrows a single view for one session. Memory is the RSS
+of the process plus the Chromium helper processes it spawned.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+from PyQt6.QtCore import QUrl  # noqa: E402
+from PyQt6.QtWidgets import QApplication  # noqa: E402
+import main  # noqa: E402
+from music_study import CsvStorage, LibraryIndex, PracticeHistory  # noqa: E402
+
+
+def process_tree_rss(root_pid):
+    # Linux only: sums VmRSS over root_pid and all of its descendants
+    parents = {}
+    rss = {}
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/status") as status:
+                fields = dict(line.split(":", 1) for line in status if ":" in line)
+        except OSError:
+            continue
+        pid = int(entry)
+        parents[pid] = int(fields["PPid"])
+        rss[pid] = int(fields.get("VmRSS", "0 kB").split()[0]) * 1024
+    total = 0
+    for pid in rss:
+        ancestor = pid
+        while ancestor and ancestor != root_pid:
+            ancestor = parents.get(ancestor)
+        if ancestor == root_pid:
+            total += rss[pid]
+    return total
+
+
+def wait_for_load(app, web_view, timeout=30):
+    finished = []
+    web_view.loadFinished.connect(finished.append)
+    web_view.setUrl(QUrl("about:blank"))
+    deadline = time.perf_counter() + timeout
+    while not finished and time.perf_counter() < deadline:
+        app.processEvents()
+
+
+def run_mode(mode, tabs):
+    app = QApplication(sys.argv[:1])
+    rss_before = process_tree_rss(os.getpid())
+    start = time.perf_counter()
+    created = []
+    for number in range(tabs):
+        tab = main.Tab(CsvStorage(os.devnull), f"Tab {number}", PracticeHistory(os.devnull),
+                       LibraryIndex(os.devnull))
+        if mode == "per-tab":
+            tab.web_view = main.QWebEngineView()
+            tab.web_view.settings().setAttribute(main.QWebEngineSettings.WebAttribute.PluginsEnabled, True)
+            tab.web_view.settings().setAttribute(main.QWebEngineSettings.WebAttribute.PdfViewerEnabled, True)
+            tab.display_stacked_layout.addWidget(tab.web_view)
+            wait_for_load(app, tab.web_view)
+        created.append(tab)
+    startup = time.perf_counter() - start
+    if mode == "pooled":
+        tab = created[0]
+        tab.web_view = main.pdf_viewer_pool().borrow()
+        tab.display_stacked_layout.addWidget(tab.web_view)
+        wait_for_load(app, tab.web_view)
+    rss_after = process_tree_rss(os.getpid())
+    return {"mode": mode, "tabs": tabs, "startup_s": startup, "rss_bytes": rss_after - rss_before}
+
+
+def run():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tabs", type=int, default=20)
+    parser.add_argument("--mode", choices=["per-tab", "pooled"], help="run a single mode in this process")
+    args = parser.parse_args()
+    if args.mode:
+        print(json.dumps(run_mode(args.mode, args.tabs)))
+        return
+    results = {}
+    for mode in ("per-tab", "pooled"):
+        output = subprocess.run([sys.executable, __file__, "--mode", mode, "--tabs", str(args.tabs)],
+                                check=True, capture_output=True, text=True).stdout
+        results[mode] = json.loads(output.strip().splitlines()[-1])
+    results["savings"] = {
+        "startup_s": results["per-tab"]["startup_s"] - results["pooled"]["startup_s"],
+        "rss_bytes": results["per-tab"]["rss_bytes"] - results["pooled"]["rss_bytes"]
+    }
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    run()
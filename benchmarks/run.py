@@ -0,0 +1,257 @@
+"""Benchmarks for loading, validating, selecting, editing and saving piece libraries.
+
+    python benchmarks/run.py                        # 1k, 10k and 100k pieces, compared to baseline.json
+    python benchmarks/run.py --sizes 1000000 --gui  # also time Tab loading on the offscreen Qt platform
+    python benchmarks/run.py --save-baseline        # record the current numbers as the new baseline
+
+Loading is timed from the CSV (the regular path) and from a binary snapshot; "rss" holds the peak
+resident memory each of the two loads adds, measured in a fresh process.
+
+Results are printed (and optionally written) as JSON. When a baseline is available every timing
+or memory figure more than --tolerance above it is reported as a regression and the exit code is 1;
+figures the baseline does not have yet are listed under "unchecked".
+"""
+import argparse
+import csv
+import datetime
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.library import PROFICIENCY_WEIGHTS, write_library  # noqa: E402
+from music_study import (CsvStorage,  # noqa: E402
+                         EditHistory,
+                         PieceStore,
+                         LibraryIndex,
+                         PracticeHistory,
+                         SpacedRepetitionScheduler,
+                         allocate,
+                         priority_column,
+                         ValidationReport,
+                         save_csv,
+                         select_pieces,
+                         validate_rows)
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+# Timings closer than this to the baseline are noise, whatever the ratio
+MIN_REGRESSION_S = 0.002
+
+
+def measure(function, repeat, prepare=None):
+    timings = []
+    for _ in range(repeat):
+        argument = prepare() if prepare else None
+        start = time.perf_counter()
+        function(argument)
+        timings.append(time.perf_counter() - start)
+    return {"min_s": min(timings), "median_s": statistics.median(timings)}
+
+
+# Loads one tab in a fresh interpreter and prints how much the load grew its peak resident memory.
+# Linux carries ru_maxrss over from the parent process, so there VmHWM (reset by exec) is read instead.
+RSS_PROBE = """
+import sys
+sys.path.insert(0, sys.argv[1])
+from music_study import CsvStorage, PieceStore, ValidationReport
+
+def peak_rss():
+    try:
+        with open("/proc/self/status") as status:
+            return next(int(line.split()[1]) * 1024 for line in status if line.startswith("VmHWM"))
+    except OSError:
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+before = peak_rss()
+data = PieceStore()
+CsvStorage(sys.argv[2], snapshot=sys.argv[3] == "1").load(data, ValidationReport())
+print(peak_rss() - before)
+"""
+
+
+def load_store(file_path, snapshot=False):
+    data = PieceStore()
+    CsvStorage(file_path, snapshot=snapshot).load(data, ValidationReport())
+    return data
+
+
+def load_rss(file_path, snapshot=False):
+    # None where neither is available (Windows)
+    try:
+        output = subprocess.run([sys.executable, "-c", RSS_PROBE, ROOT, file_path, "1" if snapshot else "0"],
+                                capture_output=True, text=True, check=True).stdout
+    except subprocess.CalledProcessError:
+        return None
+    return int(output)
+
+
+def run_size(size, folder, args):
+    source = write_library(os.path.join(folder, f"library_{size}.csv"), size, seed=args.seed,
+                           never_ratio=args.never_ratio, proficiency=args.proficiency,
+                           corruption_rate=args.corruption_rate)
+    work = os.path.join(folder, "data_1.csv")
+
+    def fresh_copy():
+        # Loading repairs corrupted rows in place, so every run starts from the generated file
+        shutil.copyfile(source, work)
+        return work
+
+    with open(source, newline="") as csv_file:
+        rows = list(csv.DictReader(csv_file))
+    data = load_store(fresh_copy())
+    # A tab of its own for the snapshot loads: the first load writes data_2.snap, and rewriting the
+    # CSV (as fresh_copy does) would make it stale again
+    snapshot_work = os.path.join(folder, "data_2.csv")
+    shutil.copyfile(source, snapshot_work)
+    load_store(snapshot_work, snapshot=True)
+    scheduler = SpacedRepetitionScheduler(data)
+    scheduler.rebuild()
+    priorities = priority_column(data.minutes, data.last_practiced, data.proficiency)
+    results = {
+        "load": measure(load_store, args.repeat, fresh_copy),
+        "snapshot_load": measure(lambda _: load_store(snapshot_work, snapshot=True), args.repeat),
+        "validate": measure(lambda copies: sum(1 for _ in validate_rows(copies, ValidationReport())), args.repeat,
+                            lambda: [dict(row) for row in rows]),
+        "select": measure(lambda rng: select_pieces(data, args.pieces, args.minutes, rng=rng), args.repeat,
+                          lambda: random.Random(args.seed)),
+        # The spaced repetition scheduler pays for a full scan once, when the tab is loaded,
+        # and then pops its due queue for every session
+        "sm2_rebuild": measure(lambda _: SpacedRepetitionScheduler(data).rebuild(), args.repeat),
+        "sm2_select": measure(lambda _: scheduler.select(args.pieces, args.minutes), args.repeat),
+        # Every piece of the library in one split, the scale of a week long plan
+        "allocate": measure(lambda _: allocate(priorities, 20 * size, step=5), args.repeat),
+        # Deleting half of the table as one selection and undoing it
+        "bulk_delete": measure(lambda edits: (edits.delete(range(0, len(edits.pieces), 2)), edits.undo()),
+                               args.repeat, lambda: EditHistory(load_store(fresh_copy()))),
+        "save": measure(lambda _: save_csv(os.path.join(folder, "saved.csv"), data), args.repeat),
+    }
+    for name in ("load", "snapshot_load", "validate", "save"):
+        results[name]["rows_per_s"] = size / results[name]["min_s"]
+
+    tracemalloc.start()
+    load_store(fresh_copy())
+    results["memory"] = {"peak_bytes": tracemalloc.get_traced_memory()[1]}
+    tracemalloc.reset_peak()
+    load_store(snapshot_work, snapshot=True)
+    results["snapshot_memory"] = {"peak_bytes": tracemalloc.get_traced_memory()[1]}
+    tracemalloc.stop()
+    results["rss"] = {"csv_bytes": load_rss(fresh_copy()), "snapshot_bytes": load_rss(snapshot_work, snapshot=True)}
+
+    if args.gui:
+        results["tab_load"] = measure(lambda file_path: load_gui_tab(gui_tab(file_path)), args.repeat, fresh_copy)
+        results["tab_snapshot_load"] = measure(lambda _: load_gui_tab(gui_tab(snapshot_work, snapshot=True)),
+                                               args.repeat)
+    return results
+
+
+def gui_tab(file_path, snapshot=False):
+    import main
+    prefix = os.path.splitext(file_path)[0]
+    return main.Tab(CsvStorage(file_path, snapshot=snapshot), "Benchmark", PracticeHistory(prefix),
+                    LibraryIndex(f"{prefix}.json"))
+
+
+def load_gui_tab(tab):
+    # The rows are read in the background; the load counts until the tab is fully usable
+    from PyQt6.QtCore import QEventLoop
+    loop = QEventLoop()
+    tab.dataLoaded.connect(loop.quit)
+    tab.ensureLoaded()
+    loop.exec()
+    return tab
+
+
+def start_gui():
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    from PyQt6.QtWidgets import QApplication, QDialog
+    application = QApplication(sys.argv[:1])
+    # Corrupted libraries would otherwise stop on the validation report dialog
+    QDialog.exec = lambda dialog: 0
+    return application
+
+
+def compare(results, baseline, tolerance):
+    # Returns the regressions and the figures that have no baseline to be checked against
+    regressions = []
+    unchecked = []
+    for size, cases in results.items():
+        for case, figures in cases.items():
+            for figure in ("min_s", "peak_bytes"):
+                if figure not in figures:
+                    continue
+                expected = baseline.get(size, {}).get(case, {}).get(figure)
+                if not expected:
+                    unchecked.append({"size": size, "case": case, "figure": figure})
+                    continue
+                if figures[figure] <= expected * (1 + tolerance):
+                    continue
+                if figure == "min_s" and figures[figure] - expected < MIN_REGRESSION_S:
+                    continue
+                regressions.append({"size": size, "case": case, "figure": figure,
+                                    "baseline": expected, "current": figures[figure],
+                                    "ratio": figures[figure] / expected})
+    return regressions, unchecked
+
+
+def run():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", default="1000,10000,100000",
+                        help="comma separated library sizes, e.g. 1000,1000000")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--pieces", type=int, default=5, help="pieces per selected session")
+    parser.add_argument("--minutes", type=int, default=60, help="session length")
+    parser.add_argument("--never-ratio", type=float, default=0.2, help="share of never practiced pieces")
+    parser.add_argument("--proficiency", choices=sorted(PROFICIENCY_WEIGHTS), default="uniform")
+    parser.add_argument("--corruption-rate", type=float, default=0.0, help="share of rows with an invalid field")
+    parser.add_argument("--gui", action="store_true", help="also time Tab loading (needs PyQt6)")
+    parser.add_argument("--output", help="write the results to this file")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=0.5, help="allowed slowdown before flagging")
+    args = parser.parse_args()
+
+    if args.gui:
+        application = start_gui()  # noqa: F841
+    results = {}
+    with tempfile.TemporaryDirectory() as folder:
+        for size in (int(size) for size in args.sizes.split(",")):
+            results[str(size)] = run_size(size, folder, args)
+    report = {
+        "meta": {"date": datetime.datetime.now().isoformat(timespec="seconds"),
+                 "python": platform.python_version(), "platform": platform.platform(),
+                 "options": {key: value for key, value in vars(args).items()
+                             if key not in ("output", "baseline", "save_baseline")}},
+        "results": results
+    }
+    if args.save_baseline:
+        with open(args.baseline, "w") as baseline_file:
+            json.dump(report, baseline_file, indent=2)
+    elif os.path.exists(args.baseline):
+        with open(args.baseline) as baseline_file:
+            report["regressions"], report["unchecked"] = compare(results, json.load(baseline_file)["results"],
+                                                                 args.tolerance)
+        if report["unchecked"]:
+            print(f"{len(report['unchecked'])} figures have no baseline and were not checked, "
+                  "record one with --save-baseline", file=sys.stderr)
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as output_file:
+            output_file.write(output)
+    print(output)
+    return 1 if report.get("regressions") else 0
+
+
+if __name__ == "__main__":
+    sys.exit(run())
@@ -5,103 +5,110 @@ from PyQt6.QtWidgets import (QApplication,
                              QWidget,
                              QGridLayout,
                              QLabel,
-                             QTableWidget,
-                             QTableWidgetItem,
+                             QTableView,
+                             QAbstractItemView,
                              QFileDialog,
                              QSpinBox,
+                             QComboBox,
+                             QCheckBox,
                              QTabWidget,
                              QVBoxLayout,
+                             QHBoxLayout,
                              QStackedLayout,
                              QScrollArea,
                              QSizePolicy,
                              QMessageBox,
                              QToolButton,
                              QDialog,
-                             QDialogButtonBox)
-from PyQt6.QtCore import Qt, QTimer, QUrl
-from PyQt6.QtGui import QFont, QPixmap
+                             QDialogButtonBox,
+                             QPlainTextEdit,
+                             QProgressBar,
+                             QLineEdit,
+                             QInputDialog)
+from PyQt6.QtCore import (Qt,
+                          QSize,
+                          QBuffer,
+                          QByteArray,
+                          QIODevice,
+                          QTimer,
+                          QFileSystemWatcher,
+                          QUrl,
+                          QAbstractTableModel,
+                          QModelIndex,
+                          QObject,
+                          QRunnable,
+                          QThreadPool,
+                          pyqtSignal)
+from PyQt6.QtGui import QFont, QPixmap, QImage, QImageReader, QAction, QKeySequence
 from PyQt6.QtWebEngineWidgets import QWebEngineView
 from PyQt6.QtWebEngineCore import QWebEngineSettings
-import csv
+try:
+    from PyQt6.QtPdf import QPdfDocument
+except ImportError:
+    # Without QtPdf, PDFs simply get no previews
+    QPdfDocument = None
 import os
-import glob
-import random
-import datetime
-from math import ceil, floor
+import sqlite3
+import time
+from collections import OrderedDict
+from functools import lru_cache
+from math import ceil
+from music_study import (TABLE_COLUMNS,
+                         EXTENSIONS,
+                         PieceStore,
+                         EditHistory,
+                         PracticeHistory,
+                         LibraryIndex,
+                         THUMBNAIL_FOLDER_NAME,
+                         DiskCache,
+                         preview_key,
+                         scan_import,
+                         PlanCache,
+                         PlanSnapshot,
+                         plan_key,
+                         plan_week,
+                         SearchIndex,
+                         TabIndex,
+                         SCHEDULERS,
+                         DEFAULT_SCHEDULER,
+                         make_scheduler,
+                         StudySession,
+                         practiced_minutes,
+                         ValidationReport,
+                         date_text,
+                         max_pieces,
+                         output_folder_path,
+                         open_storage,
+                         history_prefix,
+                         index_path,
+                         tab_options,
+                         set_tab_option,
+                         tab_numbers,
+                         metrics)
+
+RENDER_CACHE_BYTES = 256 * 1024 * 1024
+RENDER_THREADS = 2
+# Row previews in the tables and the stand-in shown while a sheet is rendered, both kept on disk
+THUMBNAIL_SIZE = 32
+THUMBNAIL_MEMORY_ITEMS = 1024
+PREVIEW_WIDTH = 960
+# Watcher events are collected for this long before the changed folders are scanned
+FOLDER_SCAN_DELAY_MS = 500
+# How often the session labels are refreshed; the timing itself comes from StudySession
+SESSION_REFRESH_MS = 250
+# With metrics on, the event loop lag is sampled this often and the metrics are written out every
+# METRICS_FLUSH_MS; the diagnostics panel refreshes every DIAGNOSTICS_REFRESH_MS
+LAG_PROBE_MS = 100
+METRICS_FLUSH_MS = 10000
+DIAGNOSTICS_REFRESH_MS = 1000
+# Table columns ordered by the search index; the name and date added columns are sorted when asked
+INDEXED_COLUMNS = {TABLE_COLUMNS.index("Total Practice Time (min)"): "minutes",
+                   TABLE_COLUMNS.index("Last Practiced"): "last_practiced",
+                   TABLE_COLUMNS.index("Proficiency"): "proficiency"}
 
-TABLE_COLUMNS = ["Name", "Total Practice Time (min)", "Date Added", "Last Practiced", "Proficiency"]
-EXTENSIONS = ["png", "jpg", "jpeg", "pdf"]
-
-executable_dir = os.path.dirname(os.path.abspath(__file__))
-folder_name = "data"
-output_folder_path = os.path.join(executable_dir, folder_name)
 os.makedirs(output_folder_path, exist_ok=True)
 
 
-def generate_csv(index):
-    file_name = f"data_{index}.csv"
-    file_path = os.path.join(output_folder_path, file_name)
-    with open(file_path, "a", newline="") as csv_file:
-        pass
-    return file_path
-
-
-def save_csv(file_path, data):
-    with open(file_path, "w", newline="") as csv_file:
-        fieldnames = data[0].keys()
-        writer = csv.DictWriter(csv_file, fieldnames=fieldnames)
-        writer.writeheader()
-        for row in data:
-            writer.writerow(row)
-
-
-def custom_sort_key(item):
-    key = (item[1], random.random())
-    return key
-
-
-def interval_split(pieces, time):
-    total_priority = sum(piece[1] for piece in pieces)
-    num_pieces = len(pieces)
-    piece_time_list = []
-    for i in range(num_pieces):
-        piece_priority = pieces[i][1]
-        if i == num_pieces - 1:
-            allocated_time = time
-        else:
-            allocated_time = round((piece_priority / total_priority) * time)
-            if allocated_time < 10:
-                allocated_time = 10
-        piece_time_list.append(allocated_time)
-        time -= allocated_time
-        total_priority -= piece_priority
-    return piece_time_list
-
-
-def select_pieces(pieces, num_pieces, time):
-    priorities = [assess_priority(piece) for piece in pieces]
-    combined = list(zip(pieces, priorities))
-    sorted_pieces = sorted(combined, key=custom_sort_key)
-    selected_pieces = sorted_pieces[-num_pieces:]
-    practice_time_list = interval_split(selected_pieces, time)
-    return [{"Name": selected_pieces[i][0]["Name"], "Time": practice_time_list[i]}
-            for i in range(num_pieces)]
-
-
-def assess_priority(piece):
-    priority = 1
-    if piece["Last Practiced"] == "Never":
-        priority = 4
-    elif datetime.datetime.now() - datetime.datetime.strptime(piece["Last Practiced"], "%d-%m-%Y") > \
-            datetime.timedelta(days=2):
-        if float(piece["Total Practice Time (min)"]) < 1200:
-            priority = 3
-        else:
-            priority = 2
-    priority /= int(piece["Proficiency"])
-    return priority
-
-
 def session_timer_text(time):
     if time > 60:
         return f"{time // 60} h {time % 60} min"
@@ -118,52 +125,6 @@ def piece_timer_text(time):
     return f"{time // 60} min {time % 60} s"
 
 
-def checkData(row):
-    name = row["Name"]
-    invalid = False
-    for key, value in row.items():
-        if key == "Name":
-            extension = value.split(".")[-1]
-            if extension not in EXTENSIONS:
-                popMessageBox("Invalid file extension", f"The file {name} contains an unsupported "
-                                                        f"extension and will be removed.")
-                return None, True
-        elif key == "Total Practice Time (min)":
-            try:
-                time = int(value)
-                if time < 0:
-                    raise ValueError
-            except ValueError:
-                popMessageBox("Invalid value", f"{name} contains an invalid value at column '{key}': '{value}'."
-                                               f"\n The value will be reset to the default value.")
-                row[key] = '0'
-                invalid = True
-        elif key == "Last Practiced" or key == "Date Added":
-            if key == "Last Practiced" and value == "Never":
-                continue
-            try:
-                _ = datetime.datetime.strptime(value, "%d-%m-%Y")
-            except ValueError:
-                popMessageBox("Invalid value", f"{name} contains an invalid value at column '{key}': '{value}'."
-                                               f"\n The value will be reset to the default value.")
-                if key == "Date Added":
-                    row[key] = datetime.datetime.now().strftime("%d-%m-%Y")
-                else:
-                    row[key] = "Never"
-                invalid = True
-        else:
-            try:
-                proficiency = int(value)
-                if proficiency < 1 or proficiency > 10:
-                    raise ValueError
-            except ValueError:
-                popMessageBox("Invalid value", f"{name} contains an invalid value at column '{key}': '{value}'."
-                                               f"\n The value will be reset to the default value.")
-                row[key] = "1"
-                invalid = True
-    return row, invalid
-
-
 def popMessageBox(title, text):
     msg_box = QMessageBox()
     msg_box.setIcon(QMessageBox.Icon.Warning)
@@ -173,6 +134,294 @@ def popMessageBox(title, text):
     msg_box.exec()
 
 
+def render_key(path, width):
+    # The modification time is part of the key so an edited scan is never served stale
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        mtime = None
+    return path, mtime, width
+
+
+@metrics.timed("scale_image")
+def load_scaled_image(path, width):
+    # QImage (unlike QPixmap) can be decoded and scaled outside the GUI thread
+    image = QImage(path)
+    if image.isNull():
+        return None
+    return image.scaledToWidth(width, Qt.TransformationMode.SmoothTransformation)
+
+
+@metrics.timed("render_pdf_page")
+def render_page(path, width):
+    # First page of a PDF
+    if QPdfDocument is None:
+        return None
+    document = QPdfDocument(None)
+    document.load(path)
+    if document.pageCount() < 1:
+        return None
+    page_size = document.pagePointSize(0)
+    if page_size.width() <= 0:
+        return None
+    image = document.render(0, QSize(width, round(width * page_size.height() / page_size.width())))
+    document.close()
+    return None if image.isNull() else image
+
+
+def load_preview_source(path, width):
+    # Decodes straight to the preview size, which for big scans is much cheaper than a full decode
+    if path.split(".")[-1] == "pdf":
+        return render_page(path, width)
+    reader = QImageReader(path)
+    size = reader.size()
+    if size.isValid() and size.width() > width:
+        reader.setScaledSize(QSize(width, max(1, round(size.height() * width / size.width()))))
+    image = reader.read()
+    return None if image.isNull() else image
+
+
+def encode_image(image, image_format):
+    data = QByteArray()
+    buffer = QBuffer(data)
+    buffer.open(QIODevice.OpenModeFlag.WriteOnly)
+    image.save(buffer, image_format)
+    return bytes(data)
+
+
+@metrics.timed("decode_preview")
+def decode_image(data):
+    image = QImage.fromData(data)
+    return None if image.isNull() else image
+
+
+def cached_preview(path, kind, size, digest=None):
+    key = preview_key(path, kind, size, digest)
+    if key is None:
+        return None
+    data = thumbnail_cache().get(key)
+    image = None if data is None else decode_image(data)
+    if image is None:
+        image = load_preview_source(path, size)
+        if image is not None:
+            thumbnail_cache().put(key, encode_image(image, "PNG"))
+    return image
+
+
+def stored_preview(path, width, digest=None):
+    # Only what is already on disk; None means the sheet has to be rendered
+    key = preview_key(path, "preview", PREVIEW_WIDTH, digest)
+    data = None if key is None else thumbnail_cache().get(key)
+    image = None if data is None else decode_image(data)
+    if image is None:
+        return None
+    return image.scaledToWidth(width, Qt.TransformationMode.FastTransformation)
+
+
+def store_preview(path, image, digest=None):
+    key = preview_key(path, "preview", PREVIEW_WIDTH, digest)
+    if key is not None and key not in thumbnail_cache():
+        if image.width() > PREVIEW_WIDTH:
+            image = image.scaledToWidth(PREVIEW_WIDTH, Qt.TransformationMode.SmoothTransformation)
+        thumbnail_cache().put(key, encode_image(image, "JPG"))
+
+
+@lru_cache(maxsize=None)
+def thumbnail_cache():
+    return DiskCache(os.path.join(output_folder_path, THUMBNAIL_FOLDER_NAME))
+
+
+class RenderCache:
+    # LRU of rendered images bounded by their total size in bytes
+    def __init__(self, max_bytes=RENDER_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.images = OrderedDict()
+
+    def __contains__(self, key):
+        return key in self.images
+
+    def get(self, key):
+        image = self.images.get(key)
+        if image is not None:
+            self.images.move_to_end(key)
+        return image
+
+    def put(self, key, image):
+        if key in self.images:
+            self.size -= self.images.pop(key).sizeInBytes()
+        self.images[key] = image
+        self.size += image.sizeInBytes()
+        while self.size > self.max_bytes and len(self.images) > 1:
+            _, evicted = self.images.popitem(last=False)
+            self.size -= evicted.sizeInBytes()
+
+
+class RenderSignals(QObject):
+    rendered = pyqtSignal(object, object)
+
+
+class RenderTask(QRunnable):
+    def __init__(self, key, signals, digest=None):
+        super().__init__()
+        self.key = key
+        self.signals = signals
+        self.digest = digest
+
+    def run(self):
+        path, _, width = self.key
+        image = load_scaled_image(path, width)
+        if image is not None:
+            store_preview(path, image, self.digest)
+        self.signals.rendered.emit(self.key, image)
+
+
+class PreviewTask(QRunnable):
+    def __init__(self, path, digest):
+        super().__init__()
+        self.path = path
+        self.digest = digest
+
+    def run(self):
+        cached_preview(self.path, "preview", PREVIEW_WIDTH, self.digest)
+
+
+class ImagePrefetcher(QObject):
+    # Decodes and scales upcoming session images in a thread pool; results land in the cache
+    # through a queued signal, so the cache itself is only touched from the GUI thread
+    imageReady = pyqtSignal(object)
+
+    def __init__(self, cache=None):
+        super().__init__()
+        self.cache = RenderCache() if cache is None else cache
+        self.pending = set()
+        self.pool = QThreadPool()
+        self.pool.setMaxThreadCount(RENDER_THREADS)
+        self.signals = RenderSignals()
+        self.signals.rendered.connect(self.onRendered)
+
+    def prefetch(self, paths, width, index=None):
+        # index (a LibraryIndex) lets the previews written on the way be shared by identical files
+        for path in paths:
+            key = render_key(path, width)
+            if key not in self.cache and key not in self.pending:
+                self.pending.add(key)
+                self.pool.start(RenderTask(key, self.signals, None if index is None else index.current_hash(path)))
+
+    def preparePreviews(self, paths, index=None):
+        # PDFs are shown by the web view, so only their stored first page is prepared
+        for path in paths:
+            digest = None if index is None else index.current_hash(path)
+            key = preview_key(path, "preview", PREVIEW_WIDTH, digest)
+            if key is not None and key not in thumbnail_cache():
+                self.pool.start(PreviewTask(path, digest))
+
+    def cached(self, path, width):
+        return self.cache.get(render_key(path, width))
+
+    def image(self, path, width, digest=None):
+        key = render_key(path, width)
+        image = self.cache.get(key)
+        if image is None:
+            image = load_scaled_image(path, width)
+            if image is not None:
+                self.cache.put(key, image)
+                store_preview(path, image, digest)
+        return image
+
+    def onRendered(self, key, image):
+        self.pending.discard(key)
+        if image is not None:
+            self.cache.put(key, image)
+            self.imageReady.emit(key)
+
+
+class ThumbnailSignals(QObject):
+    rendered = pyqtSignal(str, object)
+
+
+class ThumbnailTask(QRunnable):
+    def __init__(self, path, index, signals):
+        super().__init__()
+        self.path = path
+        self.index = index
+        self.signals = signals
+
+    def run(self):
+        # Checking the index entry against the file is a stat call, made here rather than while painting
+        digest = None if self.index is None else self.index.current_hash(self.path)
+        self.signals.rendered.emit(self.path, cached_preview(self.path, "thumbnail", THUMBNAIL_SIZE, digest))
+
+
+class ThumbnailProvider(QObject):
+    # Row previews for the piece tables. Only rows that are painted ask for one; it comes from the disk
+    # cache or is rendered there by a worker the first time, and the recent ones stay in memory.
+    ready = pyqtSignal(str)
+
+    def __init__(self):
+        super().__init__()
+        self.pixmaps = OrderedDict()
+        self.pending = set()
+        self.pool = QThreadPool()
+        self.pool.setMaxThreadCount(1)
+        self.signals = ThumbnailSignals()
+        self.signals.rendered.connect(self.onRendered)
+
+    def pixmap(self, path, index=None):
+        pixmap = self.pixmaps.get(path)
+        if pixmap is not None:
+            self.pixmaps.move_to_end(path)
+            return None if pixmap.isNull() else pixmap
+        if path not in self.pending:
+            self.pending.add(path)
+            self.pool.start(ThumbnailTask(path, index, self.signals))
+        return None
+
+    def onRendered(self, path, image):
+        self.pending.discard(path)
+        # Files that cannot be read get a null pixmap, so they are not tried again on every paint
+        self.pixmaps[path] = QPixmap() if image is None else QPixmap.fromImage(image)
+        while len(self.pixmaps) > THUMBNAIL_MEMORY_ITEMS:
+            self.pixmaps.popitem(last=False)
+        if image is not None:
+            self.ready.emit(path)
+
+
+@lru_cache(maxsize=None)
+def thumbnail_provider():
+    return ThumbnailProvider()
+
+
+@lru_cache(maxsize=None)
+def image_prefetcher():
+    return ImagePrefetcher()
+
+
+class PdfViewerPool:
+    # Web engine views are expensive, so tabs borrow one for the length of a study session
+    # instead of owning one each; normally a single view is ever created
+    def __init__(self):
+        self.idle = []
+
+    def borrow(self):
+        if self.idle:
+            return self.idle.pop()
+        web_view = QWebEngineView()
+        web_view.settings().setAttribute(QWebEngineSettings.WebAttribute.PluginsEnabled, True)
+        web_view.settings().setAttribute(QWebEngineSettings.WebAttribute.PdfViewerEnabled, True)
+        return web_view
+
+    def release(self, web_view):
+        web_view.setParent(None)
+        web_view.setUrl(QUrl("about:blank"))
+        self.idle.append(web_view)
+
+
+@lru_cache(maxsize=None)
+def pdf_viewer_pool():
+    return PdfViewerPool()
+
+
 class CorruptedDataDialog(QDialog):
     def __init__(self, tab_name):
         super().__init__()
@@ -191,22 +440,567 @@ class CorruptedDataDialog(QDialog):
         self.setLayout(self.layout)
 
 
+class ValidationReportDialog(QDialog):
+    def __init__(self, tab_name, report):
+        super().__init__()
+        self.report = report
+
+        self.setWindowTitle("Invalid data")
+        self.resize(800, 400)
+
+        button_box = QDialogButtonBox.StandardButton.Ok
+
+        self.buttonBox = QDialogButtonBox(button_box)
+        self.buttonBox.accepted.connect(self.accept)
+        export_button = self.buttonBox.addButton("Export list", QDialogButtonBox.ButtonRole.ActionRole)
+        export_button.clicked.connect(self.exportReport)
+
+        counts = ", ".join(f"{column}: {count}" for column, count in self.report.counts().items())
+        message = QLabel(f"{len(self.report)} invalid values were found in {tab_name} and fixed or removed.\n"
+                         f"{counts}")
+        issues = QPlainTextEdit()
+        issues.setReadOnly(True)
+        issues.setPlainText("\n".join(self.report.lines()))
+
+        self.layout = QVBoxLayout()
+        self.layout.addWidget(message)
+        self.layout.addWidget(issues)
+        self.layout.addWidget(self.buttonBox)
+        self.setLayout(self.layout)
+
+    def exportReport(self):
+        file_path, _ = QFileDialog.getSaveFileName(self, "Export list", "validation_report.csv", "CSV (*.csv)")
+        if file_path:
+            self.report.write_csv(file_path)
+
+
+class PlanSignals(QObject):
+    planned = pyqtSignal(object, object)
+
+
+class PlanTask(QRunnable):
+    def __init__(self, key, snapshots, requests, days, signals):
+        super().__init__()
+        self.key = key
+        self.snapshots = snapshots
+        self.requests = requests
+        self.days = days
+        self.signals = signals
+
+    def run(self):
+        self.signals.planned.emit(self.key, plan_week(self.snapshots, self.requests, self.days))
+
+
+class WeekPlanner(QObject):
+    # Plans run in a worker thread on snapshots taken here, on the GUI thread, so the tables can
+    # keep changing meanwhile; finished plans are cached until one of their tables changes
+    planned = pyqtSignal(object, object)
+
+    def __init__(self):
+        super().__init__()
+        self.cache = PlanCache()
+        self.pending = set()
+        self.pool = QThreadPool()
+        self.pool.setMaxThreadCount(1)
+        self.signals = PlanSignals()
+        self.signals.planned.connect(self.onPlanned)
+
+    def plan(self, tabs, requests, days):
+        key = plan_key(tabs, requests, days)
+        plan = self.cache.get(key)
+        if plan is None and key not in self.pending:
+            self.pending.add(key)
+            snapshots = {tab: PlanSnapshot(pieces) for tab, pieces in tabs.items()}
+            self.pool.start(PlanTask(key, snapshots, requests, days, self.signals))
+        return key, plan
+
+    def onPlanned(self, key, plan):
+        self.pending.discard(key)
+        self.cache.put(key, plan)
+        self.planned.emit(key, plan)
+
+
+@lru_cache(maxsize=None)
+def week_planner():
+    return WeekPlanner()
+
+
+class WeekPlanDialog(QDialog):
+    def __init__(self, tabs):
+        super().__init__()
+        self.tabs = tabs
+        self.key = None
+
+        self.setWindowTitle("Week plan")
+        self.resize(800, 600)
+
+        button_box = QDialogButtonBox.StandardButton.Close
+
+        self.buttonBox = QDialogButtonBox(button_box)
+        self.buttonBox.rejected.connect(self.reject)
+        plan_button = self.buttonBox.addButton("Plan", QDialogButtonBox.ButtonRole.ActionRole)
+        plan_button.clicked.connect(self.planWeek)
+
+        self.days_spinbox = QSpinBox()
+        self.days_spinbox.setRange(1, 28)
+        self.days_spinbox.setValue(7)
+        options_layout = QGridLayout()
+        options_layout.addWidget(QLabel("Days"), 0, 0)
+        options_layout.addWidget(self.days_spinbox, 0, 1)
+        options_layout.addWidget(QLabel("Session duration (min)"), 1, 1)
+        options_layout.addWidget(QLabel("Number of pieces"), 1, 2)
+        # One row per tab: whether it is planned, then the session length and size, from the tab
+        self.rows = []
+        for i, tab in enumerate(self.tabs):
+            checkbox = QCheckBox(tab.name)
+            checkbox.setChecked(True)
+            minutes_spinbox = QSpinBox()
+            minutes_spinbox.setRange(tab.time_spinbox.minimum(), tab.time_spinbox.maximum())
+            minutes_spinbox.setSingleStep(tab.time_spinbox.singleStep())
+            minutes_spinbox.setValue(tab.time_spinbox.value())
+            pieces_spinbox = QSpinBox()
+            pieces_spinbox.setRange(1, 30)
+            pieces_spinbox.setValue(tab.num_pieces_spinbox.value())
+            options_layout.addWidget(checkbox, i + 2, 0)
+            options_layout.addWidget(minutes_spinbox, i + 2, 1)
+            options_layout.addWidget(pieces_spinbox, i + 2, 2)
+            self.rows.append((tab, checkbox, minutes_spinbox, pieces_spinbox))
+
+        self.plan_text = QPlainTextEdit()
+        self.plan_text.setReadOnly(True)
+
+        self.layout = QVBoxLayout()
+        self.layout.addLayout(options_layout)
+        self.layout.addWidget(self.plan_text)
+        self.layout.addWidget(self.buttonBox)
+        self.setLayout(self.layout)
+
+        week_planner().planned.connect(self.onPlanned)
+        self.waiting = False
+        for tab in self.tabs:
+            tab.dataLoaded.connect(self.onTabLoaded)
+
+    def onTabLoaded(self):
+        if self.waiting:
+            self.planWeek()
+
+    def planWeek(self):
+        tabs = {}
+        requests = []
+        loading = False
+        for tab, checkbox, minutes_spinbox, pieces_spinbox in self.rows:
+            if checkbox.isChecked():
+                tab.ensureLoaded()
+                loading = loading or tab.loading
+                tabs[tab.name] = tab.data
+                requests.append({"tab": tab.name, "minutes": minutes_spinbox.value(),
+                                 "pieces": pieces_spinbox.value()})
+        self.waiting = loading
+        if loading:
+            # Planned again by onTabLoaded once every tab is in
+            self.plan_text.setPlainText("Loading tabs...")
+            return
+        self.key, plan = week_planner().plan(tabs, requests, self.days_spinbox.value())
+        if plan is None:
+            self.plan_text.setPlainText("Planning...")
+        else:
+            self.showPlan(plan)
+
+    def onPlanned(self, key, plan):
+        if key == self.key:
+            self.showPlan(plan)
+
+    def showPlan(self, plan):
+        lines = []
+        for session in plan:
+            lines.append(f"{session['date']}  {session['tab']}, {session['minutes']} min")
+            lines.extend(f"    {piece['Time']:>4} min  {piece['Name'].split('/')[-1].split('.')[0]}"
+                         for piece in session["pieces"])
+        self.plan_text.setPlainText("\n".join(lines))
+
+    def done(self, result):
+        week_planner().planned.disconnect(self.onPlanned)
+        for tab in self.tabs:
+            tab.dataLoaded.disconnect(self.onTabLoaded)
+        super().done(result)
+
+
+class IndexSignals(QObject):
+    built = pyqtSignal(object, object, object)
+
+
+class IndexTask(QRunnable):
+    def __init__(self, tab, snapshot, signals):
+        super().__init__()
+        self.tab = tab
+        self.snapshot = snapshot
+        self.signals = signals
+
+    def run(self):
+        version, names, columns = self.snapshot
+        self.signals.built.emit(self.tab, version, TabIndex(names, columns))
+
+
+class SearchIndexer(QObject):
+    # Builds a tab's search index in a worker once its rows are loaded, so the first search or
+    # sort does not have to; an index built from a table that changed meanwhile is dropped
+    def __init__(self):
+        super().__init__()
+        self.pool = QThreadPool()
+        self.pool.setMaxThreadCount(1)
+        self.signals = IndexSignals()
+        self.signals.built.connect(self.onBuilt)
+
+    def prepare(self, tab):
+        snapshot = search_index().snapshot(tab)
+        if snapshot is not None:
+            self.pool.start(IndexTask(tab, snapshot, self.signals))
+
+    def onBuilt(self, tab, version, index):
+        search_index().install(tab, version, index)
+
+
+@lru_cache(maxsize=None)
+def search_index():
+    return SearchIndex()
+
+
+@lru_cache(maxsize=None)
+def search_indexer():
+    return SearchIndexer()
+
+
+class EventLoopMonitor(QObject):
+    # A timer due every LAG_PROBE_MS: how late it fires is how long the event loop was busy, i.e.
+    # how long the window could not react to anything
+    def __init__(self):
+        super().__init__()
+        self.last = None
+        self.timer = QTimer()
+        self.timer.setTimerType(Qt.TimerType.PreciseTimer)
+        self.timer.setInterval(LAG_PROBE_MS)
+        self.timer.timeout.connect(self.probe)
+        self.flush_timer = QTimer()
+        self.flush_timer.setInterval(METRICS_FLUSH_MS)
+        self.flush_timer.timeout.connect(metrics.flush)
+
+    def start(self):
+        self.last = time.perf_counter()
+        self.timer.start()
+        self.flush_timer.start()
+
+    def probe(self):
+        now = time.perf_counter()
+        metrics.observe("event_loop_lag", max(0.0, now - self.last - LAG_PROBE_MS / 1000))
+        self.last = now
+
+
+@lru_cache(maxsize=None)
+def event_loop_monitor():
+    return EventLoopMonitor()
+
+
+def start_metrics():
+    metrics.enable(os.path.join(output_folder_path, metrics.METRICS_FILE_NAME), metrics.PROMETHEUS_FILE)
+    event_loop_monitor().start()
+
+
+def diagnostics_text():
+    if not metrics.enabled:
+        return "Metrics are off. Start the app with MUSIC_STUDY_METRICS=1, or turn them on for this run."
+    summary = metrics.registry.summary()
+    lines = [f"{'Operation':<20}{'Count':>8}{'p50 ms':>10}{'p90 ms':>10}{'p99 ms':>10}{'Max ms':>10}"]
+    for name, timing in summary["timings"].items():
+        lines.append(f"{name:<20}{timing['count']:>8}" +
+                     "".join(f"{timing[figure] * 1000:>10.2f}" for figure in ("p50_s", "p90_s", "p99_s", "max_s")))
+    if summary["counters"]:
+        lines.append("")
+        lines.extend(f"{name:<20}{value:>8}" for name, value in sorted(summary["counters"].items()))
+    lines.append("")
+    lines.append(f"Percentiles of the last {metrics.RECENT_SAMPLES} samples; written to "
+                 f"{metrics.registry.jsonl_path} every {METRICS_FLUSH_MS // 1000} s.")
+    return "\n".join(lines)
+
+
+class DiagnosticsDialog(QDialog):
+    def __init__(self):
+        super().__init__()
+
+        self.setWindowTitle("Diagnostics")
+        self.resize(800, 500)
+
+        button_box = QDialogButtonBox.StandardButton.Close
+
+        self.buttonBox = QDialogButtonBox(button_box)
+        self.buttonBox.rejected.connect(self.reject)
+        self.enable_button = self.buttonBox.addButton("Turn metrics on", QDialogButtonBox.ButtonRole.ActionRole)
+        self.enable_button.clicked.connect(self.enableMetrics)
+        self.enable_button.setVisible(not metrics.enabled)
+
+        self.text = QPlainTextEdit()
+        self.text.setReadOnly(True)
+        font = QFont("monospace")
+        font.setStyleHint(QFont.StyleHint.Monospace)
+        self.text.setFont(font)
+
+        self.layout = QVBoxLayout()
+        self.layout.addWidget(self.text)
+        self.layout.addWidget(self.buttonBox)
+        self.setLayout(self.layout)
+
+        self.timer = QTimer()
+        self.timer.setInterval(DIAGNOSTICS_REFRESH_MS)
+        self.timer.timeout.connect(self.refresh)
+        self.timer.start()
+        self.refresh()
+
+    def refresh(self):
+        self.text.setPlainText(diagnostics_text())
+
+    def enableMetrics(self):
+        start_metrics()
+        self.enable_button.hide()
+        self.refresh()
+
+    def done(self, result):
+        self.timer.stop()
+        super().done(result)
+
+
+class PieceTableModel(QAbstractTableModel):
+    # Reads cells straight from the PieceStore, so only the visible rows are ever materialized
+    proficiencyEdited = pyqtSignal(int, str)
+
+    def __init__(self, data, library_index=None, key=None):
+        super().__init__()
+        self.pieces = data
+        self.library_index = library_index
+        # Off while the rows are still being loaded
+        self.editable = True
+        # While the table is filtered or sorted, the names of the rows on show in view order; None
+        # shows the whole table in its own order. key names the table in search_index().
+        self.key = key
+        self.view = None
+        self.filter = None
+        self.sort_column = -1
+        self.descending = False
+        thumbnail_provider().ready.connect(self.thumbnailReady)
+
+    def pieceRow(self, row):
+        # Table row shown at a view row, None if the piece is gone
+        if self.view is None:
+            return row
+        return self.pieces.find(self.view[row])
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self.pieces) if self.view is None else len(self.view)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(TABLE_COLUMNS)
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        row = self.pieceRow(index.row()) if index.isValid() else None
+        if row is None:
+            return None
+        if index.column() == 0 and role == Qt.ItemDataRole.DecorationRole:
+            return thumbnail_provider().pixmap(self.pieces.names[row], self.library_index)
+        if role not in (Qt.ItemDataRole.DisplayRole, Qt.ItemDataRole.EditRole):
+            return None
+        column = index.column()
+        if column == 0:
+            return self.pieces.names[row].split("/")[-1].split(".")[0]
+        elif column == 1:
+            return str(self.pieces.minutes[row])
+        elif column == 2:
+            return date_text(self.pieces.date_added[row])
+        elif column == 3:
+            return date_text(self.pieces.last_practiced[row])
+        return str(self.pieces.proficiency[row])
+
+    def headerData(self, section, orientation, role=Qt.ItemDataRole.DisplayRole):
+        if role == Qt.ItemDataRole.DisplayRole and orientation == Qt.Orientation.Horizontal:
+            return TABLE_COLUMNS[section]
+        return super().headerData(section, orientation, role)
+
+    def flags(self, index):
+        flags = super().flags(index)
+        if self.editable and index.column() == TABLE_COLUMNS.index("Proficiency"):
+            flags |= Qt.ItemFlag.ItemIsEditable
+        return flags
+
+    def setData(self, index, value, role=Qt.ItemDataRole.EditRole):
+        if role != Qt.ItemDataRole.EditRole or index.column() != TABLE_COLUMNS.index("Proficiency"):
+            return False
+        row = self.pieceRow(index.row())
+        if row is None:
+            return False
+        self.proficiencyEdited.emit(row, str(value))
+        return True
+
+    def sort(self, column, order=Qt.SortOrder.AscendingOrder):
+        # Column -1 puts the table back in its own order
+        self.sort_column = column
+        self.descending = order == Qt.SortOrder.DescendingOrder
+        self.reset()
+
+    def setFilter(self, names):
+        # Shows only the given pieces, or every piece again for None
+        self.filter = None if names is None else set(names)
+        self.reset()
+
+    def viewNames(self):
+        pieces = self.pieces
+        column = self.sort_column
+        if column in INDEXED_COLUMNS:
+            names = search_index().order(self.key, INDEXED_COLUMNS[column], self.descending)
+        elif column == 0:
+            names = sorted(pieces.names, key=lambda name: name.split("/")[-1].split(".")[0].lower(),
+                           reverse=self.descending)
+        elif column == TABLE_COLUMNS.index("Date Added"):
+            rows = sorted(range(len(pieces)), key=pieces.date_added.__getitem__, reverse=self.descending)
+            names = [pieces.names[row] for row in rows]
+        else:
+            names = pieces.names
+        if self.filter is not None:
+            names = [name for name in names if name in self.filter]
+        return names
+
+    def refreshRows(self, first, last):
+        # Rows of the table; a filtered or sorted view is refreshed as a whole
+        if self.view is not None:
+            first, last = 0, len(self.view) - 1
+        if last >= first:
+            self.dataChanged.emit(self.index(first, 0), self.index(last, len(TABLE_COLUMNS) - 1))
+
+    def appendRow(self):
+        if self.view is not None:
+            self.reset()
+            return
+        row = len(self.pieces) - 1
+        self.beginInsertRows(QModelIndex(), row, row)
+        self.endInsertRows()
+
+    def appendRows(self, chunk):
+        first = len(self.pieces)
+        self.beginInsertRows(QModelIndex(), first, first + len(chunk) - 1)
+        self.pieces.extend(chunk)
+        self.endInsertRows()
+
+    def reset(self):
+        self.beginResetModel()
+        # Rows still being loaded are shown as they arrive
+        if self.editable and (self.filter is not None or self.sort_column >= 0):
+            self.view = self.viewNames()
+        else:
+            self.view = None
+        self.endResetModel()
+
+    def thumbnailReady(self, name):
+        row = self.pieces.find(name)
+        if row is None:
+            return
+        first, last = (row, row) if self.view is None else (0, len(self.view) - 1)
+        if last >= first:
+            self.dataChanged.emit(self.index(first, 0), self.index(last, 0), [Qt.ItemDataRole.DecorationRole])
+
+
+class ImportSignals(QObject):
+    scanned = pyqtSignal(object, object, bool)
+
+
+class ImportTask(QRunnable):
+    def __init__(self, names, index, folders, watched, signals):
+        super().__init__()
+        self.names = names
+        self.index = index
+        self.folders = folders
+        self.watched = watched
+        self.signals = signals
+
+    def run(self):
+        plan, visited = scan_import(self.names, self.index, self.folders, self.watched)
+        self.signals.scanned.emit(plan, visited, self.watched is None)
+
+
+class LoadSignals(QObject):
+    chunk = pyqtSignal(object, float)
+    finished = pyqtSignal(object, object)
+
+
+class LoadTask(QRunnable):
+    # Streams a tab's rows from its storage in chunks; after cancel() it stops at the next chunk
+    # and reports nothing
+    def __init__(self, storage, signals):
+        super().__init__()
+        self.storage = storage
+        self.signals = signals
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+    def run(self):
+        report = ValidationReport()
+        error = None
+        chunks = self.storage.stream(report)
+        try:
+            for chunk, progress in chunks:
+                if self.cancelled:
+                    return
+                self.signals.chunk.emit(chunk, progress)
+        except Exception as exception:
+            # Whatever stops the load (unreadable file, malformed rows, a corrupt snapshot) is reported,
+            # otherwise the tab would wait for the rows forever
+            error = exception
+        finally:
+            chunks.close()
+        if not self.cancelled:
+            self.signals.finished.emit(report, error)
+
+
 class Tab(QWidget):
-    def __init__(self, csv_file_path, name):
+    # Persisted by MainApp in the tab options
+    optionChanged = pyqtSignal(str, object)
+    dataLoaded = pyqtSignal()
+
+    def __init__(self, storage, name, history, index, options=None):
         super().__init__()
         self.name = name
-        self.csv_file_path = csv_file_path
-        self.data = []
+        self.storage = storage
+        self.history = history
+        self.index = index
+        self.options = dict(options or {})
+        self.data = PieceStore()
+        self.edits = EditHistory(self.data)
+        self.scheduler = make_scheduler(self.options.get("scheduler", DEFAULT_SCHEDULER), self.data, self.history)
+        # Imported folders are watched; a change rescans only the folders it names, after a short delay
+        # that merges the bursts of events a copy or move produces
+        self.watcher = QFileSystemWatcher()
+        self.watcher.directoryChanged.connect(self.folderChanged)
+        self.changed_folders = set()
+        self.folder_scan_timer = QTimer()
+        self.folder_scan_timer.setSingleShot(True)
+        self.folder_scan_timer.setInterval(FOLDER_SCAN_DELAY_MS)
+        self.folder_scan_timer.timeout.connect(self.scanChangedFolders)
+        self.importing = False
+        self.import_queue = []
+        self.import_signals = ImportSignals()
+        self.import_signals.scanned.connect(self.onImportScanned)
+        self.loaded = False
+        self.loading = False
+        self.load_task = None
+        self.load_signals = None
+        self.load_progress = QProgressBar()
+        self.load_progress.setFormat("Loading pieces... %p%")
+        self.load_progress.hide()
         self.session_pieces = []
-        self.piece_display_name = None
-        self.remaining_session_time = 0
-        self.remaining_piece_time = 0
+        self.session = None
         self.session_timer = QTimer()
-        self.session_timer.setInterval(60000)
-        self.session_timer.timeout.connect(self.sessionCountdown)
-        self.piece_timer = QTimer()
-        self.piece_timer.setInterval(1000)
-        self.piece_timer.timeout.connect(self.pieceCountdown)
+        self.session_timer.setInterval(SESSION_REFRESH_MS)
+        self.session_timer.timeout.connect(self.refreshSession)
+        image_prefetcher().imageReady.connect(self.imageReady)
 
         self.save_changes_button = QPushButton("Save changes")
         self.save_changes_button.setDisabled(True)
@@ -230,42 +1024,76 @@ class Tab(QWidget):
         self.time_spinbox.valueChanged.connect(self.setNumPiecesRange)
         self.num_pieces_spinbox = QSpinBox()
         self.setNumPiecesRange()
-
-        self.table = QTableWidget()
-        self.table.setColumnCount(5)
-        self.table.setHorizontalHeaderLabels(TABLE_COLUMNS)
+        self.scheduler_combobox = QComboBox()
+        self.scheduler_combobox.setToolTip("How the pieces of a session are chosen")
+        for scheduler_class in SCHEDULERS.values():
+            self.scheduler_combobox.addItem(scheduler_class.title, scheduler_class.name)
+        self.scheduler_combobox.setCurrentIndex(self.scheduler_combobox.findData(self.scheduler.name))
+        self.scheduler_combobox.currentIndexChanged.connect(self.changeScheduler)
+
+        search_index().register(self.name, self.data)
+        self.model = PieceTableModel(self.data, self.index, self.name)
+        self.table = QTableView()
+        self.table.setModel(self.model)
+        self.table.setIconSize(QSize(THUMBNAIL_SIZE, THUMBNAIL_SIZE))
         self.table.setColumnWidth(0, 500)
         self.table.setColumnWidth(1, 250)
         self.table.setColumnWidth(2, 250)
         self.table.setColumnWidth(3, 250)
-        self.table.setSelectionBehavior(QTableWidget.SelectionBehavior.SelectRows)
+        self.table.setSelectionBehavior(QAbstractItemView.SelectionBehavior.SelectRows)
         header = self.table.horizontalHeader()
         header.setStretchLastSection(True)
         header.setHighlightSections(False)
+        # Clicking a sorted column a third time goes back to the table's own order; sorting is
+        # turned on once the rows are loaded
+        header.setSortIndicatorClearable(True)
+        header.setSortIndicator(-1, Qt.SortOrder.AscendingOrder)
+        # Bulk edits of the selected rows from the table's context menu, each undoable as a whole
+        self.proficiency_action = QAction("Set proficiency...", self)
+        self.proficiency_action.triggered.connect(self.setSelectedProficiency)
+        self.reset_action = QAction("Reset practice", self)
+        self.reset_action.triggered.connect(self.resetSelectedPractice)
+        self.delete_action = QAction("Delete", self)
+        self.delete_action.setShortcut(QKeySequence.StandardKey.Delete)
+        self.delete_action.triggered.connect(self.deletePieces)
+        self.undo_action = QAction("Undo", self)
+        self.undo_action.setShortcut(QKeySequence.StandardKey.Undo)
+        self.undo_action.triggered.connect(self.undoEdit)
+        self.redo_action = QAction("Redo", self)
+        self.redo_action.setShortcut(QKeySequence.StandardKey.Redo)
+        self.redo_action.triggered.connect(self.redoEdit)
+        separator = QAction(self)
+        separator.setSeparator(True)
+        self.selection_actions = [self.proficiency_action, self.reset_action, self.delete_action]
+        for action in self.selection_actions + [separator, self.undo_action, self.redo_action]:
+            # Only the shown tab answers the shortcuts
+            action.setShortcutContext(Qt.ShortcutContext.WidgetWithChildrenShortcut)
+            action.setEnabled(False)
+            self.table.addAction(action)
+        self.table.setContextMenuPolicy(Qt.ContextMenuPolicy.ActionsContextMenu)
 
         self.display_stacked_layout = QStackedLayout()
         self.scroll_area = QScrollArea()
         self.scroll_area.setWidgetResizable(True)
         self.display_stacked_layout.addWidget(self.scroll_area)
-        self.web_view = QWebEngineView()
-        self.web_view.settings().setAttribute(QWebEngineSettings.WebAttribute.PluginsEnabled, True)
-        self.web_view.settings().setAttribute(QWebEngineSettings.WebAttribute.PdfViewerEnabled, True)
-        self.display_stacked_layout.addWidget(self.web_view)
+        # Borrowed from pdf_viewer_pool() when a session shows a PDF, returned when it ends
+        self.web_view = None
+        # The PDF the web view was last asked to load; a load that finishes for anything else is stale
+        self.web_view_piece = None
 
         self.stacked_layout = QStackedLayout()
 
         self.initUI()
 
-        self.loadData()
-        self.populateTable()
-        self.table.itemSelectionChanged.connect(self.handleSelectionChanged)
-        self.table.itemChanged.connect(self.proficiencyEdit)
+        self.table.selectionModel().selectionChanged.connect(self.handleSelectionChanged)
+        self.model.proficiencyEdited.connect(self.proficiencyEdit)
 
     def initUI(self):
         main_layout = QGridLayout()
         study_layout = QGridLayout()
 
         add_file_button = QPushButton("Add file")
+        import_folder_button = QPushButton("Import folder")
         start_button = QPushButton("Start session")
         start_button.setSizePolicy(QSizePolicy(QSizePolicy.Policy.Preferred, QSizePolicy.Policy.Expanding))
         stop_button = QPushButton("Stop")
@@ -275,6 +1103,7 @@ class Tab(QWidget):
         num_pieces_label = QLabel("Number of pieces")
 
         add_file_button.clicked.connect(self.addFile)
+        import_folder_button.clicked.connect(self.importFolder)
         self.save_changes_button.clicked.connect(self.saveChanges)
         self.delete_button.clicked.connect(self.deletePieces)
         start_button.clicked.connect(self.startSession)
@@ -282,15 +1111,20 @@ class Tab(QWidget):
         stop_button.clicked.connect(self.stopSession)
         skip_button.clicked.connect(self.skipPiece)
 
+        main_layout.addWidget(import_folder_button, 0, 0, 1, 1)
         main_layout.addWidget(add_file_button, 0, 1, 1, 1)
         main_layout.addWidget(self.save_changes_button, 0, 2, 1, 1)
         main_layout.addWidget(self.delete_button, 0, 3, 1, 1)
+        main_layout.addWidget(self.scheduler_combobox, 0, 4, 1, 1)
         main_layout.addWidget(self.table, 1, 0, 4, 5)
         main_layout.addWidget(practice_time_label, 5, 0, 1, 2)
         main_layout.addWidget(num_pieces_label, 5, 2, 1, 2)
         main_layout.addWidget(start_button, 5, 4, 2, 1)
         main_layout.addWidget(self.time_spinbox, 6, 0, 1, 2)
         main_layout.addWidget(self.num_pieces_spinbox, 6, 2, 1, 2)
+        main_layout.addWidget(self.load_progress, 7, 0, 1, 5)
+        # Everything that needs the whole table waits for the background load
+        self.load_controls = [import_folder_button, add_file_button, start_button, self.scheduler_combobox]
 
         study_layout.addWidget(self.piece_time_label, 0, 0, 1, 5)
         study_layout.addLayout(self.display_stacked_layout, 1, 0, 4, 5)
@@ -311,194 +1145,345 @@ class Tab(QWidget):
         self.stacked_layout.addWidget(study_screen)
         self.setLayout(self.stacked_layout)
 
-    def loadData(self):
-        save_changes = False
-        with open(self.csv_file_path, mode='r') as csv_file:
-            csv_reader = csv.DictReader(csv_file)
-            column_names = csv_reader.fieldnames
-            if column_names == TABLE_COLUMNS:
-                for row in csv_reader:
-                    row, invalid = checkData(row)
-                    if invalid:
-                        save_changes = True
-                    if row:
-                        self.data.append(row)
-            elif not column_names:
-                pass
-            else:
-                dialog = CorruptedDataDialog(self.name)
-                dialog.exec()
-        if save_changes:
-            self.saveChanges()
-
-    def populateTable(self):
-        for piece in self.data:
-            self.addTableItem(piece)
+    def loadData(self, report):
+        if not self.storage.finish_load(self.data, report):
+            dialog = CorruptedDataDialog(self.name)
+            dialog.exec()
+        elif report:
+            dialog = ValidationReportDialog(self.name, report)
+            dialog.exec()
+
+    def ensureLoaded(self):
+        # Tabs read their data the first time they are shown, in a worker: rows appear in the table
+        # chunk by chunk, so browsing starts right away, and the rest of the tab waits for the end
+        if self.loaded:
+            return
+        self.loaded = True
+        self.loading = True
+        self.setLoadControlsEnabled(False)
+        self.load_progress.setValue(0)
+        self.load_progress.show()
+        # Fresh signals per load, so chunks still queued from a cancelled load never arrive
+        self.load_signals = LoadSignals()
+        self.load_signals.chunk.connect(self.onChunkLoaded)
+        self.load_signals.finished.connect(self.onLoadFinished)
+        self.load_task = LoadTask(self.storage, self.load_signals)
+        QThreadPool.globalInstance().start(self.load_task)
+
+    def cancelLoad(self):
+        # Stops a running load and forgets its rows; the next ensureLoaded() starts over
+        if not self.loading:
+            return
+        self.load_task.cancel()
+        self.load_signals.chunk.disconnect(self.onChunkLoaded)
+        self.load_signals.finished.disconnect(self.onLoadFinished)
+        self.load_task = None
+        self.load_signals = None
+        self.loading = False
+        self.loaded = False
+        self.data.assign(PieceStore())
+        self.edits.clear()
+        self.model.reset()
+        self.load_progress.hide()
+
+    def setLoadControlsEnabled(self, enabled):
+        for widget in self.load_controls:
+            widget.setEnabled(enabled)
+        self.model.editable = enabled
+        self.table.setSortingEnabled(enabled)
+        if not enabled:
+            self.delete_button.setDisabled(True)
+            for action in self.selection_actions:
+                action.setEnabled(False)
+        self.updateEditActions()
+
+    def onChunkLoaded(self, chunk, progress):
+        self.model.appendRows(chunk)
+        self.load_progress.setValue(round(progress * 100))
+
+    def onLoadFinished(self, report, error):
+        self.load_task = None
+        self.load_signals = None
+        self.loading = False
+        self.load_progress.hide()
+        # The rows came in without the search index seeing them
+        search_index().register(self.name, self.data)
+        if error is not None:
+            self.loaded = False
+            self.data.assign(PieceStore())
+            self.model.reset()
+            popMessageBox("Loading failed", f"Unable to load data for {self.name}, switch tabs to retry: {error}")
+            return
+        self.loadData(report)
+        self.edits.clear()
+        self.history.load()
+        self.scheduler.rebuild()
+        self.setLoadControlsEnabled(True)
+        self.model.reset()
+        self.setNumPiecesRange()
+        self.handleSelectionChanged()
+        search_indexer().prepare(self.name)
+        self.index.load()
+        folders = [folder for folder in self.options.get("folders", []) if os.path.isdir(folder)]
+        if folders:
+            # Catches what changed while the app was closed; unchanged files cost a stat call
+            self.startImport(folders, set())
+        self.dataLoaded.emit()
+
+    def changeScheduler(self, index):
+        self.scheduler = make_scheduler(self.scheduler_combobox.itemData(index), self.data, self.history)
+        if self.loaded:
+            self.scheduler.rebuild()
+        self.optionChanged.emit("scheduler", self.scheduler.name)
 
     def setNumPiecesRange(self):
-        # 10 min per piece at least
-        total_pieces = len(self.data)
-        max_num_pieces = int(self.time_spinbox.value()/10)
-        self.num_pieces_spinbox.setRange(1, max_num_pieces if total_pieces > max_num_pieces else total_pieces)
-
-    def addTableItem(self, piece):
-        column = 0
-        table_rows = self.table.rowCount()
-        self.table.setRowCount(table_rows + 1)
-        for column_name in TABLE_COLUMNS:
-            entry = piece[column_name]
-            if column_name == "Name":
-                entry = entry.split("/")[-1].split(".")[0]
-            new_item = QTableWidgetItem(entry)
-            self.table.setItem(table_rows, column, new_item)
-            if column_name != "Proficiency":
-                self.table.item(table_rows, column).setFlags(self.table.item(table_rows, column).flags()
-                                                             & ~Qt.ItemFlag.ItemIsEditable)
-            column += 1
+        self.num_pieces_spinbox.setRange(1, max_pieces(self.time_spinbox.value(), len(self.data)))
 
     def addFile(self):
         file_path, _ = QFileDialog.getOpenFileName(self, "Upload file", "", "Image, PDF (*.jpg *.png *.jpeg *.pdf)")
-        files = [piece["Name"] for piece in self.data]
         if file_path:
             if file_path.split(".")[-1] not in EXTENSIONS:
                 popMessageBox("Invalid File", "Invalid file format!")
-            elif file_path not in files:
-                piece_data = {
-                    "Name": file_path,
-                    "Total Practice Time (min)": "0",
-                    "Date Added": datetime.datetime.now().strftime("%d-%m-%Y"),
-                    "Last Practiced": "Never",
-                    "Proficiency": "1"
-                }
-                self.data.append(piece_data)
-                self.table.itemChanged.disconnect(self.proficiencyEdit)
-                self.addTableItem(piece_data)
-                self.table.itemChanged.connect(self.proficiencyEdit)
+            elif file_path not in self.data:
+                self.data.append(file_path)
+                self.scheduler.changed(file_path)
+                search_index().sync(self.name, file_path)
+                self.model.appendRow()
                 self.save_changes_button.setDisabled(False)
                 self.setNumPiecesRange()
             else:
                 popMessageBox("Invalid File", "This file has already been uploaded!")
 
+    def importFolder(self):
+        folder = QFileDialog.getExistingDirectory(self, "Import folder")
+        if folder:
+            folders = self.options.get("folders", [])
+            if folder not in folders:
+                self.options["folders"] = folders + [folder]
+                self.optionChanged.emit("folders", self.options["folders"])
+            self.startImport([folder])
+
+    def folderChanged(self, folder):
+        self.changed_folders.add(folder)
+        self.folder_scan_timer.start()
+
+    def scanChangedFolders(self):
+        folders = sorted(folder for folder in self.changed_folders if os.path.isdir(folder))
+        self.changed_folders.clear()
+        if folders:
+            self.startImport(folders, set(self.watcher.directories()))
+
+    def startImport(self, folders, watched=None):
+        # One scan at a time, since the scan updates the index; watched is None for a full import
+        # chosen by the user, whose result is reported
+        self.import_queue.append((folders, watched))
+        if not self.importing:
+            self.runNextImport()
+
+    def runNextImport(self):
+        if self.import_queue:
+            self.importing = True
+            folders, watched = self.import_queue.pop(0)
+            QThreadPool.globalInstance().start(ImportTask(list(self.data.names), self.index, folders, watched,
+                                                          self.import_signals))
+        else:
+            self.importing = False
+
+    def onImportScanned(self, plan, visited, report):
+        watched = set(self.watcher.directories())
+        new_folders = [folder for folder in visited if folder not in watched and os.path.isdir(folder)]
+        if new_folders:
+            self.watcher.addPaths(new_folders)
+        for old_name, new_name in plan.moved:
+            row = self.data.find(old_name)
+            if row is not None and new_name not in self.data:
+                self.data.rename(row, new_name)
+                self.index.entries.pop(old_name, None)
+                self.scheduler.changed(new_name)
+                search_index().sync(self.name, old_name)
+                search_index().sync(self.name, new_name)
+        for file_path in plan.added:
+            if file_path not in self.data:
+                self.data.append(file_path)
+                self.scheduler.changed(file_path)
+                search_index().sync(self.name, file_path)
+        self.index.save()
+        if plan.added or plan.moved:
+            self.model.reset()
+            self.save_changes_button.setDisabled(False)
+            self.setNumPiecesRange()
+        if report:
+            popMessageBox("Folder imported", f"{len(plan.added)} pieces added, {len(plan.moved)} moved or "
+                                             f"renamed pieces updated, {len(plan.duplicates)} duplicates skipped.")
+        self.runNextImport()
+
     def saveChanges(self):
-        save_csv(self.csv_file_path, self.data)
+        try:
+            refreshed = self.storage.save(self.data)
+        except (OSError, sqlite3.Error) as error:
+            popMessageBox("Save failed", f"The changes could not be saved, try again: {error}")
+            return
+        if refreshed:
+            # Another window or process saved this tab meanwhile; its changes were merged in
+            search_index().register(self.name, self.data)
+            search_indexer().prepare(self.name)
+            self.scheduler.rebuild()
+            self.model.reset()
+            self.setNumPiecesRange()
         self.save_changes_button.setDisabled(True)
 
+    def selectedPieceRows(self):
+        rows = (self.model.pieceRow(index.row()) for index in self.table.selectionModel().selectedRows())
+        return [row for row in rows if row is not None]
+
     def deletePieces(self):
-        selected_rows = [index.row() for index in self.table.selectionModel().selectedRows()]
-        for index in selected_rows:
-            self.data.pop(index)
-        for selected_row in reversed(selected_rows):
-            self.table.removeRow(selected_row)
-        self.save_changes_button.setDisabled(False)
-        self.setNumPiecesRange()
+        self.applyEdit(self.edits.delete, self.selectedPieceRows())
+
+    def setSelectedProficiency(self):
+        proficiency, accepted = QInputDialog.getInt(self, "Set proficiency", "Proficiency (1-10)", 1, 1, 10)
+        if accepted:
+            self.applyEdit(self.edits.set_proficiency, self.selectedPieceRows(), proficiency)
+
+    def resetSelectedPractice(self):
+        self.applyEdit(self.edits.reset_practice, self.selectedPieceRows())
+
+    def undoEdit(self):
+        self.applyEdit(self.edits.undo)
+
+    def redoEdit(self):
+        self.applyEdit(self.edits.redo)
+
+    def applyEdit(self, edit, *args):
+        # Runs a bulk edit, undo or redo, then updates the table once: a reset when pieces were
+        # removed or restored, otherwise a single range of rows
+        count = len(self.data)
+        names = edit(*args)
+        for name in names:
+            self.scheduler.changed(name)
+            search_index().sync(self.name, name)
+        if len(self.data) != count:
+            self.model.reset()
+            self.setNumPiecesRange()
+        elif names:
+            rows = [self.data.find(name) for name in names]
+            self.model.refreshRows(min(rows), max(rows))
+        if names:
+            self.save_changes_button.setDisabled(False)
+        self.updateEditActions()
+        self.handleSelectionChanged()
 
-    def proficiencyEdit(self, item: QTableWidgetItem):
-        text = item.text()
+    def updateEditActions(self):
+        self.undo_action.setEnabled(bool(self.edits.undo_steps) and not self.loading)
+        self.redo_action.setEnabled(bool(self.edits.redo_steps) and not self.loading)
+
+    def proficiencyEdit(self, row, text):
         try:
             new_proficiency = int(text)
             if new_proficiency < 1 or new_proficiency > 10:
                 raise ValueError
         except ValueError:
             popMessageBox("Invalid value", "Please provide a number with a valid value (1-10)")
-            item.setText("1")
-        else:
-            self.data[item.row()]["Proficiency"] = str(new_proficiency)
-            self.save_changes_button.setDisabled(False)
+            new_proficiency = 1
+        self.applyEdit(self.edits.set_proficiency, [row], new_proficiency)
 
     def startSession(self):
         self.saveChanges()
         self.stacked_layout.setCurrentIndex(1)
-        self.remaining_session_time = self.time_spinbox.value()
-        self.session_pieces = select_pieces(self.data,
-                                            self.num_pieces_spinbox.value(),
-                                            self.remaining_session_time)
-        self.remaining_piece_time = self.currentPiece()["Time"] * 60
-        self.piece_display_name = self.currentPieceName()
-        self.session_time_label.setText(session_timer_text(self.remaining_session_time))
+        minutes = self.time_spinbox.value()
+        num_pieces = self.num_pieces_spinbox.value()
+        with metrics.span("session_select"):
+            candidates = self.scheduler.candidates(self.storage, num_pieces)
+            self.session_pieces = self.scheduler.select(num_pieces, minutes, candidates=candidates)
+        self.session = StudySession(self.session_pieces, minutes, self.history.next_session())
+        self.session.start()
         self.session_timer.start()
-        self.piece_timer.start()
+        self.prefetchPieces()
         self.updateDisplayedFile()
-
-    def sessionCountdown(self):
-        self.remaining_session_time -= 1
-        self.session_time_label.setText(session_timer_text(self.remaining_session_time))
-        if self.remaining_session_time == 0:
+        self.updateTimeLabels()
+
+    @metrics.timed("session_tick")
+    def refreshSession(self):
+        current = self.session.current()
+        for record in self.session.advance():
+            self.updatePiece(record)
+        if self.session.finished:
             self.session_timer.stop()
-
-    def pieceCountdown(self):
-        self.remaining_piece_time -= 1
-        self.piece_time_label.setText(f"{self.piece_display_name}, "
-                                      f"remaining time: {piece_timer_text(self.remaining_piece_time)}.")
-        if self.remaining_piece_time == 0:
-            self.updatePiece()
-            self.session_pieces.pop(0)
-            if self.session_pieces:
-                self.remaining_piece_time = self.currentPiece()['Time'] * 60
-                self.piece_display_name = self.currentPieceName()
-                self.updateDisplayedFile()
-            else:
-                self.piece_timer.stop()
-                self.onSessionFinished()
+            self.onSessionFinished()
+            return
+        if self.session.current() is not current:
+            self.updateDisplayedFile()
+        self.updateTimeLabels()
+
+    def updateTimeLabels(self):
+        # Labels are only touched when their text actually changes
+        session_text = session_timer_text(ceil(self.session.remaining_session_seconds() / 60))
+        piece_text = f"{self.currentPieceName()}, " \
+                     f"remaining time: {piece_timer_text(ceil(self.session.remaining_piece_seconds()))}."
+        if self.session_time_label.text() != session_text:
+            self.session_time_label.setText(session_text)
+        if self.piece_time_label.text() != piece_text:
+            self.piece_time_label.setText(piece_text)
 
     def pauseResumeSession(self):
-        if self.session_timer.isActive():
+        if not self.session.paused:
+            self.session.pause()
             self.session_timer.stop()
-            self.piece_timer.stop()
             self.pause_button.setText("Resume")
         else:
+            self.session.resume()
             self.session_timer.start()
-            self.piece_timer.start()
             self.pause_button.setText("Pause")
 
     def stopSession(self):
         self.session_timer.stop()
-        self.piece_timer.stop()
         self.pause_button.setText("Pause")
-        if self.session_pieces:
-            self.updatePiece()
+        for record in self.session.stop():
+            self.updatePiece(record)
         self.onSessionFinished()
 
     def skipPiece(self):
-        self.updatePiece()
-        self.session_pieces.pop(0)
-        if self.session_pieces:
-            self.remaining_session_time -= ceil(self.remaining_piece_time / 60)
-            self.session_time_label.setText(session_timer_text(self.remaining_session_time))
-            self.remaining_piece_time = self.currentPiece()['Time'] * 60
-            self.piece_display_name = self.currentPieceName()
-            self.updateDisplayedFile()
-        else:
+        for record in self.session.skip():
+            self.updatePiece(record)
+        if self.session.finished:
             self.stopSession()
+        else:
+            self.updateDisplayedFile()
+            self.updateTimeLabels()
 
     def onSessionFinished(self):
         self.session_time_label.setText("")
         self.piece_time_label.setText("")
+        self.releaseWebView()
         self.saveChanges()
         self.updateTable()
         self.stacked_layout.setCurrentIndex(0)
 
     def updateTable(self):
-        self.table.itemChanged.disconnect(self.proficiencyEdit)
-        self.table.clearContents()
-        self.table.setRowCount(0)
-        self.populateTable()
-        self.table.itemChanged.connect(self.proficiencyEdit)
-
-    def updatePiece(self):
-        for piece in self.data:
-            if piece['Name'] == self.currentPiece()['Name']:
-                practice_time = int(piece['Total Practice Time (min)']) + self.currentPiece()['Time'] \
-                                - floor(self.remaining_piece_time / 60)
-                piece['Total Practice Time (min)'] = f"{practice_time}"
-                piece['Last Practiced'] = datetime.datetime.now().strftime("%d-%m-%Y")
-                break
+        self.model.refreshRows(0, len(self.data) - 1)
+
+    def updatePiece(self, record):
+        row = self.data.find(record.name)
+        if row is not None:
+            self.data.record_practice(row, practiced_minutes(record.seconds))
+            search_index().sync(self.name, record.name)
+        self.history.append(record.name, record.started_at, record.seconds, record.session)
+        self.scheduler.practiced(record.name, record.started_at)
+
+    def setFilter(self, names):
+        # Pieces to show from a search, None for all of them
+        if names is None and self.model.filter is None:
+            return
+        self.model.setFilter(names)
+        self.handleSelectionChanged()
 
     def handleSelectionChanged(self):
-        selected_rows = self.table.selectedItems()
-        if selected_rows:
+        selected_rows = self.table.selectionModel().selectedRows()
+        for action in self.selection_actions:
+            action.setEnabled(bool(selected_rows) and not self.loading)
+        if selected_rows and not self.loading:
             if not self.delete_button.isEnabled():
                 self.delete_button.setDisabled(False)
-            if len(selected_rows) == 5:
+            if len(selected_rows) == 1:
                 self.delete_button.setText("Delete Piece")
             else:
                 self.delete_button.setText("Delete Pieces")
@@ -506,36 +1491,83 @@ class Tab(QWidget):
             self.delete_button.setDisabled(True)
 
     def currentPiece(self):
-        return self.session_pieces[0]
+        return self.session.current()
 
     def currentPieceName(self):
         return self.currentPiece()["Name"].split("/")[-1].split('.')[0]
 
+    @metrics.timed("display_file")
     def updateDisplayedFile(self):
         label = self.scroll_area.findChild(QLabel)
         if label:
             label.setParent(None)
         piece = self.currentPiece()["Name"]
-        extension = piece.split(".")[1]
+        extension = piece.split(".")[-1]
+        width = self.scroll_area.width()
+        digest = self.index.current_hash(piece)
         if extension == "pdf":
-            self.display_stacked_layout.setCurrentIndex(1)
+            if self.web_view is None:
+                self.web_view = pdf_viewer_pool().borrow()
+                self.web_view.loadFinished.connect(self.showWebView)
+                self.display_stacked_layout.addWidget(self.web_view)
+            # The stored first page is shown until the viewer has loaded the document
+            preview = stored_preview(piece, width, digest)
+            if preview is None:
+                self.display_stacked_layout.setCurrentIndex(1)
+            else:
+                self.showImage(preview)
+            self.web_view_piece = piece
             self.web_view.setUrl(QUrl(piece))
         else:
-            image_label = QLabel()
-            pixmap = QPixmap(piece)
-            if pixmap.width() == 0:
-                image_label.setText("Unable to load file.")
-                image_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
-            else:
-                new_width = self.scroll_area.width()
-                new_height = pixmap.height() * new_width // pixmap.width()
-                pixmap = pixmap.scaled(new_width,
-                                       new_height,
-                                       Qt.AspectRatioMode.KeepAspectRatio,
-                                       Qt.TransformationMode.SmoothTransformation)
-                image_label.setPixmap(pixmap)
-            self.scroll_area.setWidget(image_label)
+            self.web_view_piece = None
+            image = image_prefetcher().cached(piece, width)
+            if image is None:
+                # A preview stored by an earlier run paints at once; imageReady swaps in the full render
+                image = stored_preview(piece, width, digest)
+                if image is None:
+                    image = image_prefetcher().image(piece, width, digest)
+                else:
+                    image_prefetcher().prefetch([piece], width, self.index)
+            self.showImage(image)
+
+    def showImage(self, image):
+        image_label = QLabel()
+        if image is None:
+            image_label.setText("Unable to load file.")
+            image_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
+        else:
+            image_label.setPixmap(QPixmap.fromImage(image))
+        self.scroll_area.setWidget(image_label)
+        self.display_stacked_layout.setCurrentIndex(0)
+
+    def showWebView(self):
+        # Skipping past a PDF before it finished loading must not cover the piece shown now
+        if self.web_view is None or self.session is None or self.session.finished:
+            return
+        if self.web_view_piece == self.currentPiece()["Name"]:
+            self.display_stacked_layout.setCurrentIndex(1)
+
+    def imageReady(self, key):
+        if self.session is None or self.session.finished:
+            return
+        path, _, width = key
+        if path == self.currentPiece()["Name"] and width == self.scroll_area.width():
+            self.updateDisplayedFile()
+
+    def releaseWebView(self):
+        if self.web_view is not None:
             self.display_stacked_layout.setCurrentIndex(0)
+            self.display_stacked_layout.removeWidget(self.web_view)
+            self.web_view.loadFinished.disconnect(self.showWebView)
+            pdf_viewer_pool().release(self.web_view)
+            self.web_view = None
+            self.web_view_piece = None
+
+    def prefetchPieces(self):
+        paths = [piece["Name"] for piece in self.session_pieces if piece["Name"].split(".")[-1] != "pdf"]
+        image_prefetcher().prefetch(paths, self.scroll_area.width(), self.index)
+        image_prefetcher().preparePreviews([piece["Name"] for piece in self.session_pieces
+                                            if piece["Name"].split(".")[-1] == "pdf"], self.index)
 
 
 class MainApp(QMainWindow):
@@ -551,33 +1583,88 @@ class MainApp(QMainWindow):
         self.tab_button.setText('+')
         self.tab_button.font().setBold(True)
         self.tab_widget.setCornerWidget(self.tab_button, corner=Qt.Corner.TopLeftCorner)
-        self.tab_button.clicked.connect(self.addNewTab)
+        self.tab_button.clicked.connect(lambda: self.addNewTab())
+        self.plan_button = QToolButton()
+        self.plan_button.setText("Plan week")
+        self.plan_button.clicked.connect(self.openWeekPlan)
+        self.diagnostics_button = QToolButton()
+        self.diagnostics_button.setText("Diagnostics")
+        self.diagnostics_button.clicked.connect(self.openDiagnostics)
+        self.search_box = QLineEdit()
+        self.search_box.setPlaceholderText("Search all tabs")
+        self.search_box.setClearButtonEnabled(True)
+        self.search_box.textChanged.connect(self.search)
+        corner = QWidget()
+        corner_layout = QHBoxLayout(corner)
+        corner_layout.setContentsMargins(0, 0, 0, 0)
+        corner_layout.addWidget(self.search_box)
+        corner_layout.addWidget(self.plan_button)
+        corner_layout.addWidget(self.diagnostics_button)
+        self.tab_widget.setCornerWidget(corner, corner=Qt.Corner.TopRightCorner)
+        if metrics.METRICS_REQUESTED:
+            start_metrics()
+        self.tab_widget.currentChanged.connect(self.loadCurrentTab)
 
         self.init_ui()
 
     def init_ui(self):
         self.setCentralWidget(self.tab_widget)
         self.showMaximized()
-        pattern = os.path.join(output_folder_path, 'data_*.csv')
-        matching_files = glob.glob(pattern)
-        if len(matching_files) == 0:
+        numbers = tab_numbers()
+        if len(numbers) == 0:
             self.addNewTab()
         else:
-            for file in matching_files:
-                self.addNewTab(file)
+            for number in numbers:
+                self.addNewTab(number)
 
-    def addNewTab(self, file_name=None):
+    def addNewTab(self, number=None):
         if not self.range:
             return
-        if file_name:
-            number = int(file_name.split(".")[0].split("_")[-1])
-        else:
+        if number is None:
             number = self.range[0]
         self.range.remove(number)
         tab_name = f"Tab {number}"
-        new_tab = Tab(generate_csv(number), tab_name)
+        new_tab = Tab(open_storage(number), tab_name, PracticeHistory(history_prefix(number)),
+                      LibraryIndex(index_path(number)), tab_options(number))
+        new_tab.optionChanged.connect(lambda key, value: set_tab_option(number, key, value))
+        new_tab.dataLoaded.connect(self.search)
         self.tab_widget.addTab(new_tab, tab_name)
 
+    def search(self):
+        # Filters every tab to the pieces whose path contains all the words typed, and shows the number
+        # of matches in the tab titles; tabs still loading are filtered once they are done
+        query = self.search_box.text()
+        tabs = [self.tab_widget.widget(i) for i in range(self.tab_widget.count())]
+        if query.split():
+            for tab in tabs:
+                tab.ensureLoaded()
+        tabs = [tab for tab in tabs if tab.loaded and not tab.loading]
+        with metrics.span("search"):
+            matches = search_index().search(query, [tab.name for tab in tabs])
+        for tab in tabs:
+            names = None if matches is None else matches.get(tab.name, [])
+            tab.setFilter(names)
+            title = tab.name if names is None else f"{tab.name} ({len(names)})"
+            self.tab_widget.setTabText(self.tab_widget.indexOf(tab), title)
+
+    def openWeekPlan(self):
+        dialog = WeekPlanDialog([self.tab_widget.widget(i) for i in range(self.tab_widget.count())])
+        dialog.exec()
+
+    def openDiagnostics(self):
+        dialog = DiagnosticsDialog()
+        dialog.exec()
+
+    def loadCurrentTab(self, index):
+        if index >= 0:
+            self.tab_widget.widget(index).ensureLoaded()
+
+    def closeEvent(self, event):
+        # Loads still running would otherwise hold up the exit until they finish
+        for i in range(self.tab_widget.count()):
+            self.tab_widget.widget(i).cancelLoad()
+        super().closeEvent(event)
+
 
 if __name__ == "__main__":
     main_event_thread = QApplication(sys.argv)
@@ -0,0 +1,48 @@
+from .pieces import (TABLE_COLUMNS,
+                     EXTENSIONS,
+                     DATE_FORMAT,
+                     NEVER_PRACTICED,
+                     PieceStore,
+                     date_ordinal,
+                     date_text,
+                     today_ordinal)
+from .allocation import MIN_PIECE_MINUTES, allocate
+from .selection import (PRACTICE_TIME_THRESHOLD,
+                        stale_cutoff,
+                        priority_column,
+                        top_k,
+                        max_pieces,
+                        select_pieces,
+                        assess_priority)
+from .history import PracticeHistory
+from .edits import MAX_UNDO_STEPS, EditHistory, apply_diff
+from .locking import LOCK_TIMEOUT_S, file_lock
+from . import metrics
+from .thumbnails import THUMBNAIL_FOLDER_NAME, DiskCache, preview_key
+from .library import ImportPlan, LibraryIndex, plan_import, scan_folders, scan_import
+from .planner import PlanCache, PlanSnapshot, plan_key, plan_week
+from .search import SORTED_COLUMNS, SearchIndex, TabIndex
+from .scheduling import (DEFAULT_SCHEDULER,
+                         SCHEDULERS,
+                         StepScheduler,
+                         SpacedRepetitionScheduler,
+                         make_scheduler)
+from .session import PracticeRecord, StudySession, practiced_minutes
+from .validation import ValidationIssue, ValidationReport, checkData, validate_rows
+from .storage import (STORAGE_BACKEND,
+                      output_folder_path,
+                      generate_csv,
+                      save_csv,
+                      CsvStorage,
+                      SqliteStorage,
+                      open_database,
+                      import_csv_tabs,
+                      export_csv_tab,
+                      open_storage,
+                      tab_numbers,
+                      history_prefix,
+                      index_path,
+                      tab_options,
+                      tab_scheduler,
+                      set_tab_option,
+                      load_tab)
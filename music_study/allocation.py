@@ -0,0 +1,84 @@
+import heapq
+from math import ceil, floor
+
+MIN_PIECE_MINUTES = 10
+
+
+def bounded_shares(weights, total, low, high):
+    # Continuous split of total proportional to weights with every share clamped to [low, high], i.e.
+    # the scale at which sum(clamp(scale * weight)) == total. That sum is piecewise linear in the scale,
+    # so the breakpoints where a share leaves low or reaches high are walked in order until the
+    # segment holding the total is found. Both kinds of breakpoint come in the order of decreasing
+    # weight, so one sort of the weights orders them all.
+    by_weight = sorted(weights, reverse=True)
+    breakpoints = heapq.merge(((low / weight, 0, weight) for weight in by_weight),
+                              ((high / weight, 1, weight) for weight in by_weight))
+    at_low, at_high, free_weight = len(weights), 0, 0.0
+    scale = high / by_weight[-1]
+    for point, reaches_high, weight in breakpoints:
+        if low * at_low + high * at_high + point * free_weight >= total:
+            if free_weight:
+                scale = (total - low * at_low - high * at_high) / free_weight
+            else:
+                scale = point
+            break
+        if reaches_high:
+            at_high += 1
+            free_weight -= weight
+        else:
+            at_low -= 1
+            free_weight += weight
+    return [min(high, max(low, scale * weight)) for weight in weights]
+
+
+def allocate(weights, total, minimum=MIN_PIECE_MINUTES, maximum=None, step=1):
+    # Splits total minutes proportionally to weights, in multiples of step, with every piece getting
+    # between minimum and maximum minutes. The result always adds up to total, except when even the
+    # maximum for every piece is less. Rounding uses the largest remainder method, which gives the
+    # integer split closest to the exact proportional one. With fewer steps than pieces only the pieces
+    # with the largest weights get time, and the others get 0, which the session builders leave out;
+    # counts within selection.max_pieces(total, ..., step) never get there.
+    count = len(weights)
+    if count == 0:
+        return []
+    units = total // step
+    if count > max(units, 1):
+        kept = sorted(range(count), key=lambda i: -weights[i])[:max(units, 1)]
+        result = [0] * count
+        for i, minutes in zip(kept, allocate([weights[i] for i in kept], total, minimum, maximum, step)):
+            result[i] = minutes
+        return result
+    low = ceil(minimum / step)
+    high = units if maximum is None else max(low, maximum // step)
+    if low * count > units:
+        # Not enough time for the minimum everywhere: every piece gets the same whole number of
+        # steps (at least one, as there are no more pieces than steps) and the remainder follows the weights
+        low = units // count
+    high = min(high, units)
+    if high * count <= units:
+        result = [high * step] * count
+    else:
+        weights = [max(weight, 0.0) for weight in weights]
+        if not any(weights):
+            weights = [1.0] * count
+        # A zero weight piece still gets the minimum, like any other
+        shares = bounded_shares([weight or 1e-12 for weight in weights], units, low, high)
+        result = [floor(share) for share in shares]
+        left = units - sum(result)
+        remainders = [share - value for share, value in zip(shares, result)]
+        order = sorted((i for i in range(count) if result[i] < high), key=remainders.__getitem__, reverse=True)
+        for i in order[:left]:
+            result[i] += 1
+        result = [value * step for value in result]
+    # Minutes that do not fill a whole step go to the pieces with the largest weight that have room
+    extra = total - sum(result)
+    if extra > 0:
+        for i in sorted(range(count), key=lambda i: -weights[i]):
+            room = total if maximum is None else maximum - result[i]
+            given = min(extra, room)
+            if given > 0:
+                result[i] += given
+                extra -= given
+            if not extra:
+                break
+    return result
@@ -0,0 +1,197 @@
+import argparse
+import json
+import os
+import random
+import sys
+
+from . import metrics
+from .history import PracticeHistory
+from .planner import plan_week
+from .scheduling import SCHEDULERS, make_scheduler
+from .selection import max_pieces
+from .storage import (STORAGE_BACKEND,
+                      output_folder_path,
+                      database_file_name,
+                      open_database,
+                      export_csv_tab,
+                      history_prefix,
+                      load_tab,
+                      tab_numbers,
+                      tab_scheduler)
+
+
+def plan_session(scheduler, tab, minutes, num_pieces, rng=None, bounds=None):
+    num_pieces = min(num_pieces, max_pieces(minutes, len(scheduler.pieces), (bounds or {}).get("step", 1)))
+    if num_pieces < 1:
+        return {"tab": tab, "minutes": minutes, "error": "not enough pieces or time for a session"}
+    return {"tab": tab, "minutes": minutes,
+            "pieces": scheduler.select(num_pieces, minutes, rng=rng, bounds=bounds)}
+
+
+class TabCache:
+    # Each (folder, tab) is loaded once, however many sessions are planned for it; the scheduler
+    # is the one chosen for the tab in the app unless one is given
+    def __init__(self, backend, scheduler=None):
+        self.backend = backend
+        self.scheduler = scheduler
+        self.tabs = {}
+
+    def get(self, folder, tab):
+        key = (os.path.abspath(folder), tab)
+        if key not in self.tabs:
+            if tab not in tab_numbers(folder, self.backend):
+                self.tabs[key] = None
+            else:
+                # Planning only reads; the tab file stays as it is until the app or a save repairs it
+                data, report = load_tab(tab, folder, self.backend, compact=False)
+                if report:
+                    print(f"{folder}, tab {tab}: {len(report)} invalid values were skipped or fixed for this run",
+                          file=sys.stderr)
+                self.tabs[key] = None if data is None else self.open_scheduler(folder, tab, data)
+        return self.tabs[key]
+
+    def open_scheduler(self, folder, tab, data):
+        scheduler = make_scheduler(self.scheduler or tab_scheduler(tab, folder), data,
+                                   PracticeHistory(history_prefix(tab, folder)).load())
+        scheduler.rebuild()
+        return scheduler
+
+
+def plan_request(cache, folder, tab, minutes, num_pieces, rng, bounds=None):
+    scheduler = cache.get(folder, tab)
+    if scheduler is None:
+        return {"tab": tab, "minutes": minutes, "error": f"tab {tab} not found or corrupted"}
+    return plan_session(scheduler, tab, minutes, num_pieces, rng, bounds)
+
+
+def print_plan(plan):
+    if "error" in plan:
+        print(f"Tab {plan['tab']}: {plan['error']}")
+        return
+    print(f"Tab {plan['tab']}, {plan['minutes']} min:")
+    for piece in plan["pieces"]:
+        print(f"  {piece['Time']:>4} min  {piece['Name']}")
+
+
+def allocation_bounds(args):
+    return {"step": args.granularity, "maximum": args.max_piece_minutes}
+
+
+def plan_command(args):
+    cache = TabCache(args.storage, args.scheduler)
+    rng = random.Random(args.seed)
+    plans = [plan_request(cache, args.data_dir, tab, args.minutes, args.pieces, rng, allocation_bounds(args))
+             for tab in args.tab]
+    if args.json:
+        print(json.dumps(plans if len(plans) > 1 else plans[0], indent=2))
+    else:
+        for plan in plans:
+            print_plan(plan)
+    return 1 if any("error" in plan for plan in plans) else 0
+
+
+def batch_command(args):
+    # One JSON object per input line, e.g. {"id": "anna", "data_dir": "...", "tab": 3, "minutes": 90,
+    # "pieces": 5}; one JSON plan per output line, in the same order
+    cache = TabCache(args.storage, args.scheduler)
+    rng = random.Random(args.seed)
+    source = sys.stdin if args.requests == "-" else open(args.requests)
+    with source:
+        for line in source:
+            if not line.strip():
+                continue
+            request = json.loads(line)
+            plan = plan_request(cache, request.get("data_dir", args.data_dir), int(request["tab"]),
+                                int(request["minutes"]), int(request.get("pieces", 1)), rng,
+                                allocation_bounds(args))
+            if "id" in request:
+                plan["id"] = request["id"]
+            print(json.dumps(plan))
+    return 0
+
+
+def week_command(args):
+    cache = TabCache(args.storage, args.scheduler)
+    tabs = {}
+    for tab in args.tab:
+        scheduler = cache.get(args.data_dir, tab)
+        if scheduler is None:
+            print(f"Tab {tab}: tab not found or corrupted", file=sys.stderr)
+            return 1
+        tabs[tab] = scheduler.pieces
+    requests = [{"tab": tab, "minutes": args.minutes, "pieces": args.pieces} for tab in args.tab]
+    sessions = plan_week(tabs, requests, args.days, rng=random.Random(args.seed), bounds=allocation_bounds(args))
+    if args.json:
+        print(json.dumps(sessions, indent=2))
+    else:
+        for session in sessions:
+            print(f"{session['date']}, ", end="")
+            print_plan(session)
+    return 0
+
+
+def import_command(args):
+    path = os.path.join(args.data_dir, database_file_name)
+    if os.path.exists(path):
+        print(f"{path} already exists, nothing imported", file=sys.stderr)
+        return 1
+    open_database(path)
+    print(f"Imported tabs {tab_numbers(args.data_dir, 'sqlite')} into {path}")
+    return 0
+
+
+def export_command(args):
+    connection = open_database(os.path.join(args.data_dir, database_file_name))
+    export_csv_tab(connection, args.tab, args.output)
+    return 0
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="music_study", description="Plan music practice sessions.")
+    parser.add_argument("--data-dir", default=output_folder_path, help="folder holding the tab data")
+    parser.add_argument("--storage", choices=["csv", "snapshot", "sqlite"], default=STORAGE_BACKEND)
+    parser.add_argument("--scheduler", choices=sorted(SCHEDULERS),
+                        help="how pieces are chosen (default: the one set for each tab in the app)")
+    parser.add_argument("--granularity", type=int, default=1, help="piece times are multiples of this (min)")
+    parser.add_argument("--max-piece-minutes", type=int, help="upper bound for the time of one piece")
+    parser.add_argument("--metrics", action="store_true", default=metrics.METRICS_REQUESTED,
+                        help=f"append timings to {metrics.METRICS_FILE_NAME} in the data folder when done")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    plan = commands.add_parser("plan", help="select pieces and split the time for a session")
+    plan.add_argument("--tab", type=int, action="append", required=True, help="repeat to plan several tabs")
+    plan.add_argument("--minutes", type=int, default=30)
+    plan.add_argument("--pieces", type=int, default=1)
+    plan.add_argument("--seed", type=int, help="makes the random tie-break reproducible")
+    plan.add_argument("--json", action="store_true")
+    plan.set_defaults(handler=plan_command)
+
+    batch = commands.add_parser("batch", help="plan one session per JSON line read from a file or stdin")
+    batch.add_argument("requests", nargs="?", default="-")
+    batch.add_argument("--seed", type=int)
+    batch.set_defaults(handler=batch_command)
+
+    week = commands.add_parser("week", help="plan a session per tab for each of the next days")
+    week.add_argument("--tab", type=int, action="append", required=True, help="repeat to plan several tabs")
+    week.add_argument("--days", type=int, default=7)
+    week.add_argument("--minutes", type=int, default=30, help="length of each session")
+    week.add_argument("--pieces", type=int, default=1, help="pieces per session")
+    week.add_argument("--seed", type=int)
+    week.add_argument("--json", action="store_true")
+    week.set_defaults(handler=week_command)
+
+    import_csv = commands.add_parser("import-csv", help="create the SQLite database from the CSV tabs")
+    import_csv.set_defaults(handler=import_command)
+
+    export_csv = commands.add_parser("export-csv", help="write a SQLite tab back to the CSV format")
+    export_csv.add_argument("--tab", type=int, required=True)
+    export_csv.add_argument("--output", required=True)
+    export_csv.set_defaults(handler=export_command)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.metrics:
+        metrics.enable(os.path.join(args.data_dir, metrics.METRICS_FILE_NAME), metrics.PROMETHEUS_FILE)
+    return args.handler(args)
@@ -0,0 +1,91 @@
+from collections import deque
+
+from .pieces import NEVER_PRACTICED
+
+# Bulk edits each tab can undo
+MAX_UNDO_STEPS = 50
+
+
+def piece_values(pieces, row):
+    # (position, minutes, date_added, last_practiced, proficiency) of a piece, as kept in a diff
+    return row, pieces.minutes[row], pieces.date_added[row], pieces.last_practiced[row], pieces.proficiency[row]
+
+
+def apply_diff(pieces, diff, undo=False):
+    # diff: (name, before, after) per piece, before and after being piece_values() or None when the
+    # piece is absent on that side. Moves the table to one side; removals and insertions are each a
+    # single pass over the table. Returns the names that changed.
+    removed = []
+    inserted = []
+    changed = []
+    for name, before, after in diff:
+        values = before if undo else after
+        row = pieces.find(name)
+        if values is None:
+            if row is not None:
+                removed.append(row)
+                changed.append(name)
+        elif row is None:
+            inserted.append((values[0], name) + values[1:])
+            changed.append(name)
+        elif values[1:4] == piece_values(pieces, row)[1:4]:
+            if values[4] != pieces.proficiency[row]:
+                pieces.set_proficiency(row, values[4])
+                changed.append(name)
+        else:
+            pieces.set_row(row, *values[1:])
+            changed.append(name)
+    if removed:
+        pieces.remove(removed)
+    if inserted:
+        pieces.insert(sorted(inserted))
+    return changed
+
+
+class EditHistory:
+    # Bulk edits of one table with undo and redo. Every step is kept as a diff of the pieces it
+    # touched, so undoing a delete of thousands of pieces holds their values and not a copy of the
+    # table. Diffs refer to pieces by name and stay valid while other pieces change.
+    def __init__(self, pieces, max_steps=MAX_UNDO_STEPS):
+        self.pieces = pieces
+        self.undo_steps = deque(maxlen=max_steps)
+        self.redo_steps = []
+
+    def clear(self):
+        self.undo_steps.clear()
+        self.redo_steps.clear()
+
+    def edit(self, rows, values):
+        # Applies values(row) -> piece_values() or None (delete) to rows as one undoable step
+        pieces = self.pieces
+        diff = [(pieces.names[row], piece_values(pieces, row), values(row)) for row in sorted(set(rows))]
+        changed = apply_diff(pieces, diff)
+        if changed:
+            self.undo_steps.append(diff)
+            self.redo_steps.clear()
+        return changed
+
+    def delete(self, rows):
+        return self.edit(rows, lambda row: None)
+
+    def set_proficiency(self, rows, proficiency):
+        return self.edit(rows, lambda row: piece_values(self.pieces, row)[:4] + (proficiency,))
+
+    def reset_practice(self, rows):
+        # Back to no practice time and never practiced
+        pieces = self.pieces
+        return self.edit(rows, lambda row: (row, 0, pieces.date_added[row], NEVER_PRACTICED, pieces.proficiency[row]))
+
+    def undo(self):
+        if not self.undo_steps:
+            return []
+        diff = self.undo_steps.pop()
+        self.redo_steps.append(diff)
+        return apply_diff(self.pieces, diff, undo=True)
+
+    def redo(self):
+        if not self.redo_steps:
+            return []
+        diff = self.redo_steps.pop()
+        self.undo_steps.append(diff)
+        return apply_diff(self.pieces, diff)
@@ -0,0 +1,151 @@
+import bisect
+import datetime
+import os
+import struct
+from array import array
+
+from .locking import file_lock
+
+# piece id, start (epoch seconds), duration (seconds), session id
+EVENT_FORMAT = struct.Struct("<IdfI")
+
+
+def day_of(timestamp):
+    return datetime.date.fromtimestamp(timestamp).toordinal()
+
+
+def week_of(day):
+    # Ordinal 1 is a Monday, so weeks run Monday to Sunday
+    return (day - 1) // 7
+
+
+class PracticeHistory:
+    # Every practiced interval as an event, kept in fixed-width records appended to <prefix>.events
+    # (piece names are appended to <prefix>.names, the line number being the piece id). In memory
+    # the events are columns, and the aggregates below are updated as each event arrives so that
+    # every query is a dictionary lookup. Processes sharing a tab assign ids and append events under
+    # <prefix>.lock, reading the names the others added first, so an id always means the same piece.
+    def __init__(self, prefix):
+        self.events_path = f"{prefix}.events"
+        self.names_path = f"{prefix}.names"
+        self.lock_path = f"{prefix}.lock"
+        self.names = []
+        self.ids = {}
+        self.pieces = array("I")
+        self.starts = array("d")
+        self.durations = array("f")
+        self.sessions = array("I")
+        self.total_seconds = {}
+        self.daily_seconds = {}
+        self.weekly_seconds = {}
+        # piece -> (days with practice, ascending; seconds practiced up to and including each)
+        self.running_seconds = {}
+        self.last_end = {}
+        self.streaks = {}
+
+    def __len__(self):
+        return len(self.pieces)
+
+    def load(self):
+        self.read_names()
+        if os.path.exists(self.events_path):
+            with open(self.events_path, "rb") as events_file:
+                content = events_file.read()
+            # A record cut short by a crash is ignored
+            content = content[:len(content) - len(content) % EVENT_FORMAT.size]
+            for piece, start, duration, session in EVENT_FORMAT.iter_unpack(content):
+                if piece < len(self.names):
+                    self.add(piece, start, duration, session)
+        return self
+
+    def read_names(self):
+        # Adds the names appended since the last read, by this or any other process
+        if not os.path.exists(self.names_path):
+            return
+        with open(self.names_path, encoding="utf-8") as names_file:
+            for name in names_file.read().split("\n")[len(self.names):-1]:
+                self.ids[name] = len(self.names)
+                self.names.append(name)
+
+    def piece_id(self, name):
+        # Called with the lock held
+        piece = self.ids.get(name)
+        if piece is None:
+            self.read_names()
+            piece = self.ids.get(name)
+        if piece is None:
+            piece = len(self.names)
+            with open(self.names_path, "a", encoding="utf-8") as names_file:
+                names_file.write(f"{name}\n")
+            self.ids[name] = piece
+            self.names.append(name)
+        return piece
+
+    def next_session(self):
+        return max(self.sessions, default=0) + 1
+
+    def append(self, name, start, seconds, session):
+        with file_lock(self.lock_path):
+            piece = self.piece_id(name)
+            with open(self.events_path, "ab") as events_file:
+                events_file.write(EVENT_FORMAT.pack(piece, start, seconds, session))
+        self.add(piece, start, seconds, session)
+
+    def add(self, piece, start, seconds, session):
+        self.pieces.append(piece)
+        self.starts.append(start)
+        self.durations.append(seconds)
+        self.sessions.append(session)
+        day = day_of(start)
+        self.total_seconds[piece] = self.total_seconds.get(piece, 0.0) + seconds
+        self.daily_seconds[piece, day] = self.daily_seconds.get((piece, day), 0.0) + seconds
+        self.weekly_seconds[piece, week_of(day)] = self.weekly_seconds.get((piece, week_of(day)), 0.0) + seconds
+        days, totals = self.running_seconds.setdefault(piece, ([], []))
+        if days and day < days[-1]:
+            # An event older than the latest one (another process's clock); the running sums after it move
+            position = bisect.bisect_left(days, day)
+            if days[position] != day:
+                days.insert(position, day)
+                totals.insert(position, totals[position - 1] if position else 0.0)
+            for i in range(position, len(totals)):
+                totals[i] += seconds
+        elif days and day == days[-1]:
+            totals[-1] += seconds
+        else:
+            days.append(day)
+            totals.append((totals[-1] if totals else 0.0) + seconds)
+        self.last_end[piece] = max(self.last_end.get(piece, 0.0), start + seconds)
+        last_day, length = self.streaks.get(piece, (None, 0))
+        if last_day is None or day > last_day + 1:
+            self.streaks[piece] = (day, 1)
+        elif day == last_day + 1:
+            self.streaks[piece] = (day, length + 1)
+
+    def total_minutes(self, name):
+        return self.total_seconds.get(self.ids.get(name), 0.0) / 60
+
+    def minutes_on(self, name, day):
+        return self.daily_seconds.get((self.ids.get(name), day), 0.0) / 60
+
+    def minutes_in_week(self, name, day):
+        return self.weekly_seconds.get((self.ids.get(name), week_of(day)), 0.0) / 60
+
+    def minutes_last_days(self, name, days, today=None):
+        # Difference of two running sums, found by bisection over the days the piece was practiced
+        today = datetime.date.today().toordinal() if today is None else today
+        practice_days, totals = self.running_seconds.get(self.ids.get(name), ((), ()))
+        last = bisect.bisect_right(practice_days, today)
+        first = bisect.bisect_right(practice_days, today - days)
+        return ((totals[last - 1] if last else 0.0) - (totals[first - 1] if first else 0.0)) / 60
+
+    def last_practiced(self, name):
+        # End of the last practiced interval (epoch seconds), or None
+        return self.last_end.get(self.ids.get(name))
+
+    def streak(self, name, today=None):
+        # Consecutive days with practice ending today or yesterday
+        today = datetime.date.today().toordinal() if today is None else today
+        last_day, length = self.streaks.get(self.ids.get(name), (None, 0))
+        if last_day is None or last_day < today - 1:
+            return 0
+        return length
@@ -0,0 +1,215 @@
+import hashlib
+import json
+import os
+import re
+import struct
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+from .pieces import EXTENSIONS
+
+# Hashing and metadata are I/O bound and hashlib releases the GIL, so threads are enough
+INDEX_WORKERS = min(8, (os.cpu_count() or 1) + 2)
+HASH_CHUNK_BYTES = 1024 * 1024
+PDF_PAGE = re.compile(rb"/Type\s*/Page(?!s)")
+
+ImportPlan = namedtuple("ImportPlan", ["added", "moved", "duplicates"])
+
+
+def is_sheet(path):
+    return path.rsplit(".", 1)[-1].lower() in EXTENSIONS
+
+
+def list_folder(folder):
+    # (sheets, sub folders) directly inside folder; paths use forward slashes like the ones from QFileDialog
+    sheets = []
+    folders = []
+    try:
+        entries = list(os.scandir(folder))
+    except OSError:
+        return sheets, folders
+    for entry in entries:
+        if entry.is_dir(follow_symlinks=False):
+            folders.append(entry.path.replace(os.sep, "/"))
+        elif is_sheet(entry.name):
+            sheets.append(entry.path.replace(os.sep, "/"))
+    return sheets, folders
+
+
+def walk_sheets(folder):
+    sheets = []
+    folders = [folder]
+    pending = [folder]
+    while pending:
+        found, sub_folders = list_folder(pending.pop())
+        sheets.extend(found)
+        folders.extend(sub_folders)
+        pending.extend(sub_folders)
+    return sheets, folders
+
+
+def scan_folders(folders, watched=None, workers=INDEX_WORKERS):
+    # Returns (sheets, folders visited). Every folder is listed and its sub folders are walked in
+    # parallel, which pays off on network shares and slow disks. With watched, the folders come from
+    # watcher events: only sub folders that are not watched yet (created or moved in) are walked.
+    sheets = []
+    visited = list(folders)
+    walks = []
+    for folder in folders:
+        found, sub_folders = list_folder(folder)
+        sheets.extend(found)
+        walks.extend(sub_folder for sub_folder in sub_folders if watched is None or sub_folder not in watched)
+    with ThreadPoolExecutor(workers) as executor:
+        for found, walked in executor.map(walk_sheets, walks):
+            sheets.extend(found)
+            visited.extend(walked)
+    return sorted(set(sheets)), visited
+
+
+def content_hash(path):
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as sheet_file:
+        for chunk in iter(lambda: sheet_file.read(HASH_CHUNK_BYTES), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def image_size(path):
+    # Reads the dimensions from the PNG or JPEG header without decoding the image
+    with open(path, "rb") as image_file:
+        head = image_file.read(26)
+        if head.startswith(b"\x89PNG\r\n\x1a\n") and len(head) >= 24:
+            return struct.unpack(">II", head[16:24])
+        if not head.startswith(b"\xff\xd8"):
+            return None
+        image_file.seek(2)
+        while True:
+            marker = image_file.read(4)
+            if len(marker) < 4 or marker[0] != 0xFF:
+                return None
+            length = struct.unpack(">H", marker[2:])[0]
+            if marker[1] in (0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF):
+                height, width = struct.unpack(">xHH", image_file.read(5))
+                return width, height
+            image_file.seek(length - 2, os.SEEK_CUR)
+
+
+def pdf_pages(path):
+    # Counts the page objects; good enough for an index, and needs no PDF library
+    with open(path, "rb") as pdf_file:
+        return len(PDF_PAGE.findall(pdf_file.read()))
+
+
+def file_entry(path):
+    stat = os.stat(path)
+    entry = {"hash": content_hash(path), "size": stat.st_size, "mtime": stat.st_mtime_ns}
+    try:
+        if path.rsplit(".", 1)[-1].lower() == "pdf":
+            entry["pages"] = pdf_pages(path)
+        else:
+            size = image_size(path)
+            if size is not None:
+                entry["width"], entry["height"] = size
+    except (OSError, struct.error):
+        pass
+    return entry
+
+
+def indexed_entry(path):
+    try:
+        return path, file_entry(path)
+    except OSError:
+        return path, None
+
+
+class LibraryIndex:
+    # Content hash and metadata of every sheet of a tab, kept in a JSON file. A file is only read
+    # again when its size or modification time changed, so rescanning a folder is mostly stat calls.
+    def __init__(self, path):
+        self.path = path
+        self.entries = {}
+
+    def load(self):
+        try:
+            with open(self.path) as index_file:
+                self.entries = json.load(index_file)
+        except (OSError, ValueError):
+            self.entries = {}
+        return self
+
+    def save(self):
+        temp_path = f"{self.path}.tmp"
+        with open(temp_path, "w") as index_file:
+            json.dump(self.entries, index_file)
+        os.replace(temp_path, self.path)
+
+    def stale(self, path):
+        entry = self.entries.get(path)
+        if entry is None:
+            return True
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return True
+        return entry["size"] != stat.st_size or entry["mtime"] != stat.st_mtime_ns
+
+    def update(self, paths, workers=INDEX_WORKERS):
+        # Hashes the new and changed files in a thread pool; files that disappeared leave the index
+        stale = [path for path in paths if self.stale(path)]
+        with ThreadPoolExecutor(workers) as executor:
+            for path, entry in executor.map(indexed_entry, stale):
+                if entry is None:
+                    self.entries.pop(path, None)
+                else:
+                    self.entries[path] = entry
+
+    def hash(self, path):
+        entry = self.entries.get(path)
+        return None if entry is None else entry["hash"]
+
+    def current_hash(self, path):
+        # None when the file changed since it was indexed (an edit in place fires no watcher event),
+        # so preview keys fall back to the path, size and modification time
+        return None if self.stale(path) else self.hash(path)
+
+
+def plan_import(names, index, paths):
+    # Sorts scanned paths into new pieces, pieces whose file was moved or renamed (same content, old
+    # path gone) and duplicates of a piece whose file is still there. index must cover both names and
+    # paths; names is the current piece list, which is only read.
+    known = {}
+    for name in names:
+        digest = index.hash(name)
+        if digest is not None:
+            known.setdefault(digest, name)
+    current = set(names)
+    added, moved, duplicates = [], [], []
+    for path in paths:
+        if path in current:
+            continue
+        digest = index.hash(path)
+        if digest is None:
+            continue
+        existing = known.get(digest)
+        if existing is None:
+            added.append(path)
+        elif existing in current and not os.path.exists(existing):
+            moved.append((existing, path))
+            current.discard(existing)
+        else:
+            duplicates.append((path, existing))
+            continue
+        known[digest] = path
+    return ImportPlan(added, moved, duplicates)
+
+
+def scan_import(names, index, folders, watched=None, workers=INDEX_WORKERS):
+    # Everything a folder import needs off the GUI thread: listing, hashing the new files (and the
+    # tab's own pieces the first time, to recognize moves and duplicates) and the resulting plan.
+    # Of the tab's pieces only those in the scanned folders and those never indexed are looked at,
+    # so a watcher event costs stat calls for the folders it names, not for the whole tab.
+    paths, visited = scan_folders(folders, watched, workers)
+    scanned = set(visited)
+    pieces = [name for name in names if name not in index.entries or name.rsplit("/", 1)[0] in scanned]
+    index.update(pieces + paths, workers)
+    return plan_import(names, index, paths), visited
@@ -0,0 +1,64 @@
+import os
+import time
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+    import msvcrt
+
+# A process holding a lock longer than this is assumed stuck; the waiting write fails instead of hanging
+LOCK_TIMEOUT_S = 30.0
+LOCK_POLL_S = 0.005
+
+
+def try_lock(lock_file):
+    try:
+        if fcntl is not None:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        else:
+            lock_file.seek(0)
+            msvcrt.locking(lock_file.fileno(), msvcrt.LK_NBLCK, 1)
+    except OSError:
+        return False
+    return True
+
+
+def unlock(lock_file):
+    if fcntl is not None:
+        fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+    else:
+        lock_file.seek(0)
+        msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+@contextmanager
+def file_lock(path, timeout=LOCK_TIMEOUT_S):
+    # Exclusive advisory lock on path (created empty if missing), shared by every process and thread
+    # on this machine. The OS drops it when a process dies, so a crash never leaves the library locked.
+    with open(path, "a+b") as lock_file:
+        deadline = time.monotonic() + timeout
+        while not try_lock(lock_file):
+            if time.monotonic() > deadline:
+                raise TimeoutError(f"{path} is held by another process")
+            time.sleep(LOCK_POLL_S)
+        try:
+            yield
+        finally:
+            unlock(lock_file)
+
+
+def read_stamp(path):
+    # Version stamp of a file group, bumped by every write; 0 when nothing was written yet
+    try:
+        with open(path) as stamp_file:
+            return int(stamp_file.read() or 0)
+    except (OSError, ValueError):
+        return 0
+
+
+def write_stamp(path, stamp):
+    with open(f"{path}.tmp", "w") as stamp_file:
+        stamp_file.write(str(stamp))
+    os.replace(f"{path}.tmp", path)
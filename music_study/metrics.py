@@ -0,0 +1,198 @@
+import atexit
+import bisect
+import functools
+import json
+import os
+import threading
+import time
+from collections import deque
+
+# MUSIC_STUDY_METRICS=1 turns the instrumentation on (the app writes data/metrics.jsonl), and
+# MUSIC_STUDY_PROMETHEUS=<path> also keeps a Prometheus textfile, e.g. for node_exporter
+METRICS_REQUESTED = os.environ.get("MUSIC_STUDY_METRICS", "") not in ("", "0")
+PROMETHEUS_FILE = os.environ.get("MUSIC_STUDY_PROMETHEUS") or None
+METRICS_FILE_NAME = "metrics.jsonl"
+# metrics.jsonl is rotated to metrics.jsonl.1 ... .3 when it reaches this size
+METRICS_FILE_BYTES = 5 * 1024 * 1024
+METRICS_FILE_BACKUPS = 3
+# Percentiles are taken over this many most recent samples of each timing
+RECENT_SAMPLES = 2048
+PERCENTILES = (50, 90, 99)
+# Upper bounds of the histogram buckets (seconds), shared by every timing
+BUCKETS_S = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Timing:
+    # Cumulative bucket counts for the export plus the latest samples for percentiles
+    __slots__ = ("count", "total", "max", "buckets", "recent")
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.buckets = [0] * (len(BUCKETS_S) + 1)
+        self.recent = deque(maxlen=RECENT_SAMPLES)
+
+    def observe(self, seconds):
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+        self.buckets[bisect.bisect_left(BUCKETS_S, seconds)] += 1
+        self.recent.append(seconds)
+
+    def percentiles(self, points=PERCENTILES):
+        recent = sorted(self.recent)
+        if not recent:
+            return {}
+        return {point: recent[min(len(recent) - 1, len(recent) * point // 100)] for point in points}
+
+
+class Metrics:
+    # Timings and counters of one process; thread safe, as loads and renders run in workers
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.timings = {}
+        self.counters = {}
+        self.jsonl_path = None
+        self.prometheus_path = None
+
+    def observe(self, name, seconds):
+        with self.lock:
+            timing = self.timings.get(name)
+            if timing is None:
+                timing = self.timings[name] = Timing()
+            timing.observe(seconds)
+
+    def count(self, name, amount=1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def summary(self):
+        with self.lock:
+            timings = {}
+            for name, timing in sorted(self.timings.items()):
+                timings[name] = {"count": timing.count, "sum_s": timing.total, "max_s": timing.max}
+                for point, value in timing.percentiles().items():
+                    timings[name][f"p{point}_s"] = value
+            return {"time": time.time(), "pid": os.getpid(), "timings": timings, "counters": dict(self.counters)}
+
+    def prometheus_lines(self):
+        lines = []
+        with self.lock:
+            for name, timing in sorted(self.timings.items()):
+                metric = f"music_study_{name}_seconds"
+                lines.append(f"# TYPE {metric} histogram")
+                cumulative = 0
+                for bound, count in zip(BUCKETS_S + ("+Inf",), timing.buckets):
+                    cumulative += count
+                    lines.append(f'{metric}_bucket{{le="{bound}"}} {cumulative}')
+                lines.append(f"{metric}_sum {timing.total}")
+                lines.append(f"{metric}_count {timing.count}")
+            for name, value in sorted(self.counters.items()):
+                lines.append(f"# TYPE music_study_{name}_total counter")
+                lines.append(f"music_study_{name}_total {value}")
+        return lines
+
+    def flush(self):
+        if self.jsonl_path is not None:
+            append_jsonl(self.jsonl_path, self.summary())
+        if self.prometheus_path is not None:
+            write_prometheus(self.prometheus_path, self.prometheus_lines())
+
+
+def append_jsonl(path, record, max_bytes=METRICS_FILE_BYTES, backups=METRICS_FILE_BACKUPS):
+    try:
+        size = os.path.getsize(path)
+    except OSError:
+        size = 0
+    if size >= max_bytes:
+        for i in range(backups - 1, 0, -1):
+            if os.path.exists(f"{path}.{i}"):
+                os.replace(f"{path}.{i}", f"{path}.{i + 1}")
+        os.replace(path, f"{path}.1")
+    with open(path, "a") as jsonl_file:
+        jsonl_file.write(json.dumps(record) + "\n")
+
+
+def write_prometheus(path, lines):
+    # Renamed into place, so a scraper never reads half a file
+    with open(f"{path}.tmp", "w") as prometheus_file:
+        prometheus_file.write("\n".join(lines) + "\n")
+    os.replace(f"{path}.tmp", path)
+
+
+class Span:
+    __slots__ = ("name", "start")
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exception):
+        registry.observe(self.name, time.perf_counter() - self.start)
+
+
+class NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exception):
+        pass
+
+
+# While metrics are off every hook below costs one global lookup
+enabled = False
+registry = Metrics()
+NULL_SPAN = NullSpan()
+
+
+def enable(jsonl_path=None, prometheus_path=None):
+    global enabled
+    registry.jsonl_path = jsonl_path
+    registry.prometheus_path = prometheus_path
+    if not enabled:
+        atexit.register(flush)
+    enabled = True
+
+
+def span(name):
+    # Times a with block
+    if not enabled:
+        return NULL_SPAN
+    return Span(name)
+
+
+def timed(name):
+    # Decorator form of span()
+    def decorate(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not enabled:
+                return function(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                registry.observe(name, time.perf_counter() - start)
+        return wrapper
+    return decorate
+
+
+def observe(name, seconds):
+    if enabled:
+        registry.observe(name, seconds)
+
+
+def count(name, amount=1):
+    if enabled:
+        registry.count(name, amount)
+
+
+def flush():
+    if enabled:
+        registry.flush()
@@ -0,0 +1,246 @@
+import sys
+import datetime
+from array import array
+from functools import lru_cache
+
+TABLE_COLUMNS = ["Name", "Total Practice Time (min)", "Date Added", "Last Practiced", "Proficiency"]
+EXTENSIONS = ["png", "jpg", "jpeg", "pdf"]
+DATE_FORMAT = "%d-%m-%Y"
+NEVER_PRACTICED = 0
+
+
+@lru_cache(maxsize=4096)
+def date_ordinal(text):
+    # Dates repeat a lot across a library, so each distinct string is parsed only once
+    if text == "Never":
+        return NEVER_PRACTICED
+    return datetime.datetime.strptime(text, DATE_FORMAT).toordinal()
+
+
+def date_text(ordinal):
+    if ordinal == NEVER_PRACTICED:
+        return "Never"
+    return datetime.date.fromordinal(ordinal).strftime(DATE_FORMAT)
+
+
+def today_ordinal():
+    return datetime.date.today().toordinal()
+
+
+class PieceStore:
+    # Column-oriented piece table: one typed array per numeric column, dates kept as ordinals
+    # (NEVER_PRACTICED for "Never") and a name -> row index for constant time lookups
+    __slots__ = ("names", "minutes", "date_added", "last_practiced", "proficiency", "index", "changes",
+                 "version")
+
+    def __init__(self):
+        self.names = []
+        self.minutes = array("l")
+        self.date_added = array("l")
+        self.last_practiced = array("l")
+        self.proficiency = array("b")
+        self.index = {}
+        # name -> "set" / "delete" for every piece added, replaced or removed since the last save, or
+        # a dict of field updates ({"minutes": delta, "last_practiced": day, "proficiency": value})
+        # for existing pieces, which storage merges with what other processes saved meanwhile
+        self.changes = {}
+        # Bumped by every change, so results computed from the table can tell when they are stale
+        self.version = 0
+
+    def __len__(self):
+        return len(self.names)
+
+    def __contains__(self, name):
+        return name in self.index
+
+    def find(self, name):
+        return self.index.get(name)
+
+    def append(self, name, minutes=0, date_added=None, last_practiced=NEVER_PRACTICED, proficiency=1):
+        name = sys.intern(name)
+        self.index[name] = len(self.names)
+        self.names.append(name)
+        self.minutes.append(minutes)
+        self.date_added.append(today_ordinal() if date_added is None else date_added)
+        self.last_practiced.append(last_practiced)
+        self.proficiency.append(proficiency)
+        self.changes[name] = "set"
+        self.version += 1
+        return len(self.names) - 1
+
+    def append_row(self, row):
+        return self.append(row["Name"],
+                           int(row["Total Practice Time (min)"]),
+                           date_ordinal(row["Date Added"]),
+                           date_ordinal(row["Last Practiced"]),
+                           int(row["Proficiency"]))
+
+    def extend(self, other):
+        # Appends other's rows as already saved ones; the background loader hands over its chunks this way
+        offset = len(self.names)
+        self.index.update((name, offset + i) for i, name in enumerate(other.names))
+        self.names.extend(other.names)
+        self.minutes.extend(other.minutes)
+        self.date_added.extend(other.date_added)
+        self.last_practiced.extend(other.last_practiced)
+        self.proficiency.extend(other.proficiency)
+        self.version += 1
+
+    def extend_columns(self, names, minutes, date_added, last_practiced, proficiency):
+        # Appends saved rows from raw column buffers laid out like this store's arrays (a binary
+        # snapshot), so the numbers and dates are copied as they are instead of parsed row by row
+        offset = len(self.names)
+        names = [sys.intern(name) for name in names]
+        self.index.update((name, offset + i) for i, name in enumerate(names))
+        self.names.extend(names)
+        self.minutes.frombytes(minutes)
+        self.date_added.frombytes(date_added)
+        self.last_practiced.frombytes(last_practiced)
+        self.proficiency.frombytes(proficiency)
+        self.version += 1
+
+    def upsert_row(self, row):
+        index = self.find(row["Name"])
+        if index is None:
+            return self.append_row(row)
+        self.minutes[index] = int(row["Total Practice Time (min)"])
+        self.date_added[index] = date_ordinal(row["Date Added"])
+        self.last_practiced[index] = date_ordinal(row["Last Practiced"])
+        self.proficiency[index] = int(row["Proficiency"])
+        self.changes[self.names[index]] = "set"
+        self.version += 1
+        return index
+
+    def discard(self, name):
+        index = self.find(name)
+        if index is not None:
+            self.remove([index])
+
+    def remove(self, rows):
+        # Single compaction pass, so removing many rows stays linear
+        rows = set(rows)
+        for i in rows:
+            self.changes[self.names[i]] = "delete"
+        keep = [i for i in range(len(self.names)) if i not in rows]
+        self.names = [self.names[i] for i in keep]
+        self.minutes = array("l", (self.minutes[i] for i in keep))
+        self.date_added = array("l", (self.date_added[i] for i in keep))
+        self.last_practiced = array("l", (self.last_practiced[i] for i in keep))
+        self.proficiency = array("b", (self.proficiency[i] for i in keep))
+        self.index = {name: i for i, name in enumerate(self.names)}
+        self.version += 1
+
+    def insert(self, rows):
+        # rows: (position, name, minutes, date_added, last_practiced, proficiency) sorted by position,
+        # each landing at its position in the result; a single merge pass however many there are
+        merged = [[] for _ in range(5)]
+        sources = (self.names, self.minutes, self.date_added, self.last_practiced, self.proficiency)
+        taken = 0
+        for inserted, (position, *values) in enumerate(rows):
+            end = max(taken, min(position - inserted, len(self.names)))
+            for target, source, value in zip(merged, sources, values):
+                target.extend(source[taken:end])
+                target.append(value)
+            taken = end
+            self.changes[values[0]] = "set"
+        for target, source in zip(merged, sources):
+            target.extend(source[taken:])
+        self.names = [sys.intern(name) for name in merged[0]]
+        self.minutes = array("l", merged[1])
+        self.date_added = array("l", merged[2])
+        self.last_practiced = array("l", merged[3])
+        self.proficiency = array("b", merged[4])
+        self.index = {name: i for i, name in enumerate(self.names)}
+        self.version += 1
+
+    def set_row(self, row, minutes, date_added, last_practiced, proficiency):
+        # Overwrites a piece as a whole, which storage saves as such rather than as field updates
+        self.minutes[row] = minutes
+        self.date_added[row] = date_added
+        self.last_practiced[row] = last_practiced
+        self.proficiency[row] = proficiency
+        self.changes[self.names[row]] = "set"
+        self.version += 1
+
+    def rename(self, row, name):
+        # A moved or renamed file keeps its practice data
+        name = sys.intern(name)
+        self.changes[self.names[row]] = "delete"
+        del self.index[self.names[row]]
+        self.names[row] = name
+        self.index[name] = row
+        self.changes[name] = "set"
+        self.version += 1
+
+    def set_proficiency(self, row, proficiency):
+        self.proficiency[row] = proficiency
+        self.update_change(self.names[row], "proficiency", proficiency)
+        self.version += 1
+
+    def record_practice(self, row, minutes, day=None):
+        day = today_ordinal() if day is None else day
+        self.minutes[row] += minutes
+        self.last_practiced[row] = max(self.last_practiced[row], day)
+        self.update_change(self.names[row], "minutes", minutes)
+        self.update_change(self.names[row], "last_practiced", day)
+        self.version += 1
+
+    def update_change(self, name, field, value):
+        # A piece that is saved whole anyway needs no field updates
+        change = self.changes.get(name)
+        if change == "set":
+            return
+        if not isinstance(change, dict):
+            change = self.changes[name] = {}
+        if field == "minutes":
+            value += change.get("minutes", 0)
+        elif field == "last_practiced":
+            value = max(value, change.get("last_practiced", NEVER_PRACTICED))
+        change[field] = value
+
+    def apply_update(self, name, fields):
+        # Field updates saved by any process: practice time adds up, the latest practice day wins
+        row = self.find(name)
+        if row is None:
+            return
+        self.minutes[row] += fields.get("minutes", 0)
+        self.last_practiced[row] = max(self.last_practiced[row], fields.get("last_practiced", NEVER_PRACTICED))
+        if "proficiency" in fields:
+            self.proficiency[row] = fields["proficiency"]
+        for field, value in fields.items():
+            self.update_change(name, field, value)
+        self.version += 1
+
+    def apply_changes(self, changes, rows):
+        # Replays changes taken from another store; rows holds the "set" pieces as row dicts
+        for name, change in changes.items():
+            if change == "delete":
+                self.discard(name)
+            elif change == "set":
+                self.upsert_row(rows[name])
+            else:
+                self.apply_update(name, change)
+
+    def assign(self, other):
+        # Takes over other's table in place, so everything holding this store sees the new rows
+        for column in ("names", "minutes", "date_added", "last_practiced", "proficiency", "index", "changes"):
+            setattr(self, column, getattr(other, column))
+        self.version += 1
+
+    def take_changes(self):
+        changes = self.changes
+        self.changes = {}
+        return changes
+
+    def row(self, row):
+        return {
+            "Name": self.names[row],
+            "Total Practice Time (min)": str(self.minutes[row]),
+            "Date Added": date_text(self.date_added[row]),
+            "Last Practiced": date_text(self.last_practiced[row]),
+            "Proficiency": str(self.proficiency[row])
+        }
+
+    def rows(self):
+        for i in range(len(self.names)):
+            yield self.row(i)
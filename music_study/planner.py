@@ -0,0 +1,78 @@
+import datetime
+import random
+from array import array
+from collections import OrderedDict
+
+from .allocation import allocate
+from .pieces import date_text
+from .selection import max_pieces, priority_column, top_k
+
+PLAN_CACHE_SIZE = 8
+
+
+class PlanSnapshot:
+    # Private copy of the columns the priority model reads; planned sessions are "practiced" on it,
+    # so every following session of the plan sees the pieces that were already scheduled
+    def __init__(self, pieces):
+        self.names = list(pieces.names)
+        self.minutes = array("l", pieces.minutes)
+        self.last_practiced = array("l", pieces.last_practiced)
+        self.proficiency = array("b", pieces.proficiency)
+
+    def plan(self, minutes, num_pieces, now, rng=None, bounds=None):
+        num_pieces = min(num_pieces, max_pieces(minutes, len(self.names), (bounds or {}).get("step", 1)))
+        if num_pieces < 1:
+            return []
+        priorities = priority_column(self.minutes, self.last_practiced, self.proficiency, now=now)
+        rows = top_k(priorities, num_pieces, rng)
+        times = allocate([priorities[row] for row in rows], minutes, **(bounds or {}))
+        # Pieces left without time (more pieces than steps) are not part of the session
+        rows, times = [row for row, time in zip(rows, times) if time], [time for time in times if time]
+        for row, time in zip(rows, times):
+            self.minutes[row] += time
+            self.last_practiced[row] = now.toordinal()
+        return [{"Name": self.names[row], "Time": time} for row, time in zip(rows, times)]
+
+
+def plan_week(tabs, requests, days=7, start=None, rng=None, bounds=None):
+    # tabs maps a tab to its PieceStore (or PlanSnapshot); every request, {"tab", "minutes", "pieces"},
+    # becomes one session on each of the days from start on
+    start = datetime.datetime.now() if start is None else start
+    rng = random if rng is None else rng
+    snapshots = {tab: PlanSnapshot(pieces) for tab, pieces in tabs.items()}
+    sessions = []
+    for day in range(days):
+        now = start + datetime.timedelta(days=day)
+        for request in requests:
+            sessions.append({"date": date_text(now.toordinal()),
+                             "tab": request["tab"],
+                             "minutes": request["minutes"],
+                             "pieces": snapshots[request["tab"]].plan(request["minutes"], request["pieces"],
+                                                                      now, rng, bounds)})
+    return sessions
+
+
+def plan_key(tabs, requests, days, start=None, bounds=None):
+    # A plan stays valid for the same request, the same day and unchanged tables
+    start = datetime.date.today() if start is None else start
+    return (tuple((tab, id(pieces), pieces.version) for tab, pieces in sorted(tabs.items())),
+            tuple((request["tab"], request["minutes"], request["pieces"]) for request in requests),
+            days, start.toordinal(), tuple(sorted((bounds or {}).items())))
+
+
+class PlanCache:
+    def __init__(self, maxsize=PLAN_CACHE_SIZE):
+        self.maxsize = maxsize
+        self.plans = OrderedDict()
+
+    def get(self, key):
+        plan = self.plans.get(key)
+        if plan is not None:
+            self.plans.move_to_end(key)
+        return plan
+
+    def put(self, key, plan):
+        self.plans[key] = plan
+        self.plans.move_to_end(key)
+        while len(self.plans) > self.maxsize:
+            self.plans.popitem(last=False)
@@ -0,0 +1,186 @@
+import datetime
+import heapq
+import itertools
+
+from . import metrics
+from .history import day_of
+from .pieces import NEVER_PRACTICED
+from .allocation import allocate
+from .selection import select_pieces
+
+DEFAULT_SCHEDULER = "step"
+MIN_EASE = 1.3
+START_EASE = 2.5
+MAX_WEIGHT = 4
+
+
+def review_quality(proficiency):
+    # Proficiency 1-10 as an SM-2 grade 0-5; below 3 the piece counts as not yet remembered
+    return (proficiency - 1) * 5 // 9
+
+
+def review(state, quality, day):
+    # One SM-2 step; practicing the same piece twice on the same day is one review
+    repetitions, interval, ease, last_day = state
+    if last_day == day:
+        return state
+    if quality < 3:
+        repetitions, interval = 0, 1
+    else:
+        interval = 1 if repetitions == 0 else 6 if repetitions == 1 else round(interval * ease)
+        repetitions += 1
+    ease = max(MIN_EASE, ease + 0.1 - (5 - quality) * (0.08 + (5 - quality) * 0.02))
+    return repetitions, interval, ease, day
+
+
+class StepScheduler:
+    # The original rules: Never -> 4, stale -> 3 or 2 by practice time, divided by proficiency,
+    # recomputed for the whole library at every session; staleness comes from the practice history
+    # for pieces that have events in it
+    name = "step"
+    title = "Priority rules"
+
+    def __init__(self, pieces, history=None):
+        self.pieces = pieces
+        self.history = history
+
+    def rebuild(self):
+        pass
+
+    def changed(self, name):
+        pass
+
+    def practiced(self, name, start):
+        pass
+
+    def candidates(self, storage, num_pieces):
+        # The storage's prefilter (SqliteStorage ranks in SQL) knows only the table's days, so it is
+        # used while no practice history refines them
+        return None if self.history else storage.candidates(num_pieces)
+
+    def select(self, num_pieces, time, rng=None, now=None, candidates=None, bounds=None):
+        return select_pieces(self.pieces, num_pieces, time, rng=rng, now=now, candidates=candidates, bounds=bounds,
+                             history=self.history)
+
+
+class SpacedRepetitionScheduler:
+    # SM-2 style: every piece has an interval and an ease factor, updated after each practice day with
+    # the proficiency as the grade, and is due interval days after its last practice. Due dates sit
+    # in a heap with lazy invalidation, so a session pops the k most overdue pieces and a practice
+    # pushes one entry; the library is only scanned by rebuild(), when the tab is loaded.
+    name = "sm2"
+    title = "Spaced repetition"
+
+    def __init__(self, pieces, history=None):
+        self.pieces = pieces
+        self.history = history
+        self.states = {}
+        self.entries = {}
+        self.queue = []
+        self.counter = itertools.count()
+
+    def rebuild(self):
+        self.states = {}
+        if self.history is not None:
+            # Events are in practice order, so replaying them gives each piece's review sequence
+            for piece, start in zip(self.history.pieces, self.history.starts):
+                self.apply(self.history.names[piece], day_of(start))
+        states = self.states
+        self.entries = {}
+        for row, name in enumerate(self.pieces.names):
+            if self.pieces.last_practiced[row] == NEVER_PRACTICED:
+                # Never practiced, or its practice was reset: due from the day it was added
+                states.pop(name, None)
+                self.entries[name] = [self.pieces.date_added[row], next(self.counter), name]
+                continue
+            state = states.get(name)
+            if state is None:
+                state = states[name] = self.seed(row)
+            self.entries[name] = [state[3] + state[1], next(self.counter), name]
+        self.queue = list(self.entries.values())
+        heapq.heapify(self.queue)
+
+    def seed(self, row):
+        # A piece practiced before its history was kept gets one review on its last practice day
+        return review((0, 0, START_EASE, None), review_quality(self.pieces.proficiency[row]),
+                      self.pieces.last_practiced[row])
+
+    def apply(self, name, day):
+        row = self.pieces.find(name)
+        if row is not None:
+            state = self.states.get(name, (0, 0, START_EASE, None))
+            self.states[name] = review(state, review_quality(self.pieces.proficiency[row]), day)
+
+    def due(self, name):
+        state = self.states.get(name)
+        if state is None:
+            # Never practiced pieces are due from the day they were added
+            return self.pieces.date_added[self.pieces.find(name)]
+        return state[3] + state[1]
+
+    def changed(self, name):
+        row = self.pieces.find(name)
+        if row is None:
+            return
+        if self.pieces.last_practiced[row] == NEVER_PRACTICED:
+            self.states.pop(name, None)
+        elif name not in self.states:
+            self.states[name] = self.seed(row)
+        self.push(name)
+
+    def practiced(self, name, start):
+        self.apply(name, day_of(start))
+        self.changed(name)
+
+    def push(self, name):
+        entry = [self.due(name), next(self.counter), name]
+        self.entries[name] = entry
+        heapq.heappush(self.queue, entry)
+        if len(self.queue) > 2 * len(self.entries) + 64:
+            self.queue = list(self.entries.values())
+            heapq.heapify(self.queue)
+
+    def pop(self):
+        # Entries replaced by a later push or belonging to deleted pieces are dropped here
+        while self.queue:
+            entry = heapq.heappop(self.queue)
+            name = entry[2]
+            if self.entries.get(name) is entry:
+                del self.entries[name]
+                if name in self.pieces:
+                    return entry
+        return None
+
+    def weight(self, entry, today):
+        # The further past its interval a piece is, the more of the session it gets, up to the 4:1
+        # range of the step rules
+        interval = self.states[entry[2]][1] if entry[2] in self.states else 1
+        return min(MAX_WEIGHT, 1 + max(0, today - entry[0]) / interval)
+
+    def candidates(self, storage, num_pieces):
+        # Due dates are kept here; a prefilter by the step rules does not apply
+        return None
+
+    @metrics.timed("sm2_select")
+    def select(self, num_pieces, time, rng=None, now=None, candidates=None, bounds=None):
+        today = (now or datetime.datetime.now()).toordinal()
+        selected = []
+        while len(selected) < num_pieces:
+            entry = self.pop()
+            if entry is None:
+                break
+            selected.append(entry)
+        for entry in selected:
+            self.entries[entry[2]] = entry
+            heapq.heappush(self.queue, entry)
+        weighted = [(entry[2], self.weight(entry, today)) for entry in selected]
+        practice_time_list = allocate([piece[1] for piece in weighted], time, **(bounds or {}))
+        return [{"Name": weighted[i][0], "Time": practice_time_list[i]}
+                for i in range(len(weighted)) if practice_time_list[i]]
+
+
+SCHEDULERS = {scheduler.name: scheduler for scheduler in (StepScheduler, SpacedRepetitionScheduler)}
+
+
+def make_scheduler(name, pieces, history=None):
+    return SCHEDULERS.get(name, SCHEDULERS[DEFAULT_SCHEDULER])(pieces, history)
@@ -0,0 +1,258 @@
+import bisect
+import re
+from array import array
+
+# Columns kept sorted by the index; the table sorts the other ones when asked
+SORTED_COLUMNS = ("minutes", "last_practiced", "proficiency")
+# Sorted keys are value << ID_BITS | id, so one integer array orders a column and breaks ties
+ID_BITS = 32
+ID_MASK = (1 << ID_BITS) - 1
+# An index is rebuilt once it holds more removed pieces than this many plus the live ones
+MAX_DEAD_PIECES = 1024
+EMPTY = array("i")
+
+
+def grams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def word_start(token):
+    # token not preceded by a letter or digit; the look-behind comes last so the regex engine can
+    # jump from one occurrence of the token to the next
+    return re.compile(re.escape(token) + r"(?<![^\W_]" + "." * len(token) + ")", re.DOTALL)
+
+
+def token_matcher(token):
+    # Tokens of three letters or more match anywhere, shorter ones only at the start of a word
+    if len(token) >= 3:
+        return lambda text: token in text
+    return word_start(token).search
+
+
+def row_values(pieces, row):
+    return pieces.minutes[row], pieces.last_practiced[row], pieces.proficiency[row]
+
+
+def snapshot(pieces):
+    # Copies of what a TabIndex is built from, so it can be built in a worker while the table changes
+    return list(pieces.names), tuple(array("l", getattr(pieces, column)) for column in SORTED_COLUMNS)
+
+
+class TabIndex:
+    # One tab's pieces under local ids. File names get a trigram index; folders are shared by many
+    # pieces, so the distinct folders are matched on their own and bring their pieces along. Posting
+    # lists are append only: removed ids stay in them and are skipped by the match check.
+    def __init__(self, names, columns):
+        self.names = []
+        self.files = []
+        self.folder_of = array("i")
+        self.folder_ids = {}
+        self.folders = []
+        self.folder_pieces = []
+        self.ids = {}
+        self.postings = {}
+        self.values = {column: array("l") for column in SORTED_COLUMNS}
+        # column -> sorted keys, built the first time a table is sorted by that column
+        self.sorted = {}
+        self.text = None
+        self.starts = None
+        self.dead = 0
+        for name, values in zip(names, zip(*columns)):
+            self.add(name, values)
+
+    def __len__(self):
+        return len(self.names) - self.dead
+
+    def key(self, column, piece):
+        return self.values[column][piece] << ID_BITS | piece
+
+    def add(self, name, values):
+        piece = len(self.names)
+        self.ids[name] = piece
+        self.names.append(name)
+        folder, _, file_name = name.lower().rpartition("/")
+        folder_id = self.folder_ids.get(folder)
+        if folder_id is None:
+            folder_id = self.folder_ids[folder] = len(self.folders)
+            self.folders.append(folder)
+            self.folder_pieces.append(array("i"))
+        self.folder_of.append(folder_id)
+        self.folder_pieces[folder_id].append(piece)
+        self.files.append(file_name)
+        self.text = None
+        postings = self.postings
+        for gram in grams(file_name):
+            posting = postings.get(gram)
+            if posting is None:
+                posting = postings[gram] = array("i")
+            posting.append(piece)
+        for column, value in zip(SORTED_COLUMNS, values):
+            self.values[column].append(value)
+        for column, keys in self.sorted.items():
+            bisect.insort(keys, self.key(column, piece))
+
+    def discard_key(self, column, piece):
+        keys = self.sorted.get(column)
+        if keys is None:
+            return
+        key = self.key(column, piece)
+        i = bisect.bisect_left(keys, key)
+        if i < len(keys) and keys[i] == key:
+            del keys[i]
+
+    def remove(self, name):
+        piece = self.ids.pop(name, None)
+        if piece is None:
+            return
+        for column in self.sorted:
+            self.discard_key(column, piece)
+        self.names[piece] = None
+        self.dead += 1
+
+    def update(self, name, values):
+        piece = self.ids[name]
+        for column, value in zip(SORTED_COLUMNS, values):
+            if self.values[column][piece] != value:
+                self.discard_key(column, piece)
+                self.values[column][piece] = value
+                if column in self.sorted:
+                    bisect.insort(self.sorted[column], self.key(column, piece))
+
+    def file_text(self):
+        # Every file name on one line each, for tokens too short to have a trigram: one regex scan of
+        # this finds them at C speed. Rebuilt after pieces were added.
+        if self.text is None:
+            self.text = "\n".join(self.files)
+            self.starts = array("l")
+            offset = 0
+            for file_name in self.files:
+                self.starts.append(offset)
+                offset += len(file_name) + 1
+        return self.text
+
+    def candidates(self, token, folder_hits):
+        # (count, id lists) of the pieces that may contain token: those whose file name has the
+        # token's rarest trigram, or matches outright for shorter tokens, plus the pieces of every
+        # folder matching the token. Tokens spanning folder and file name leave every piece a candidate.
+        if "/" in token:
+            return len(self.names), [range(len(self.names))]
+        if len(token) >= 3:
+            files = min((self.postings.get(token[i:i + 3], EMPTY) for i in range(len(token) - 2)), key=len)
+        else:
+            text = self.file_text()
+            starts = self.starts
+            files = sorted({bisect.bisect_right(starts, found.start()) - 1
+                            for found in word_start(token).finditer(text)})
+        parts = [files] + [self.folder_pieces[folder] for folder in folder_hits]
+        return sum(len(part) for part in parts), parts
+
+    def search(self, tokens):
+        # Candidates come from the most selective token; every token is then checked on each of them,
+        # against the file name unless the piece's folder already matched it
+        matchers = [token_matcher(token) for token in tokens]
+        hits = [{folder for folder, text in enumerate(self.folders) if match(text)} for match in matchers]
+        if all(len(token) < 3 for token in tokens):
+            # Short tokens scan every file name, so the longest of them is scanned alone
+            longest = max(range(len(tokens)), key=lambda i: len(tokens[i]))
+            _, parts = self.candidates(tokens[longest], hits[longest])
+        else:
+            _, parts = min((self.candidates(token, folder_hits) for token, folder_hits in zip(tokens, hits)
+                            if len(token) >= 3), key=lambda candidates: candidates[0])
+        candidates = parts[0] if len(parts) == 1 else sorted(set().union(*parts))
+        checks = list(zip(tokens, hits, matchers))
+        names = self.names
+        files = self.files
+        folder_of = self.folder_of
+        folders = self.folders
+        matches = []
+        for piece in candidates:
+            name = names[piece]
+            if name is None:
+                continue
+            file_name = files[piece]
+            folder = folder_of[piece]
+            for token, folder_hits, match in checks:
+                if not (folder in folder_hits or match(file_name)
+                        or ("/" in token and match(f"{folders[folder]}/{file_name}"))):
+                    break
+            else:
+                matches.append(name)
+        return matches
+
+    def order(self, column, descending=False):
+        keys = self.sorted.get(column)
+        if keys is None:
+            live = (piece for piece, name in enumerate(self.names) if name is not None)
+            keys = self.sorted[column] = array("q", sorted(self.key(column, piece) for piece in live))
+        names = self.names
+        ordered = [names[key & ID_MASK] for key in keys]
+        if descending:
+            ordered.reverse()
+        return ordered
+
+
+class SearchIndex:
+    # Search and sorted column order over the pieces of every tab. A tab is indexed the first time it
+    # is searched or sorted, unless an index built from snapshot() was installed before; after that
+    # sync() keeps the index in step with each piece that is added, changed or removed.
+    def __init__(self):
+        self.tables = {}
+        self.indexes = {}
+
+    def register(self, tab, pieces):
+        # Also used when a table was reloaded as a whole; it is indexed again on demand
+        self.tables[tab] = pieces
+        self.indexes.pop(tab, None)
+
+    def unregister(self, tab):
+        self.tables.pop(tab, None)
+        self.indexes.pop(tab, None)
+
+    def index(self, tab):
+        index = self.indexes.get(tab)
+        if index is None or index.dead > len(index) + MAX_DEAD_PIECES:
+            index = self.indexes[tab] = TabIndex(*snapshot(self.tables[tab]))
+        return index
+
+    def snapshot(self, tab):
+        # (version, names, columns) to build a tab's index elsewhere; None when it is already built
+        if tab in self.indexes:
+            return None
+        pieces = self.tables[tab]
+        return (pieces.version,) + snapshot(pieces)
+
+    def install(self, tab, version, index):
+        # Takes an index built from snapshot(tab), unless the table changed since
+        pieces = self.tables.get(tab)
+        if pieces is not None and pieces.version == version and tab not in self.indexes:
+            self.indexes[tab] = index
+
+    def sync(self, tab, name):
+        index = self.indexes.get(tab)
+        if index is None:
+            return
+        pieces = self.tables[tab]
+        row = pieces.find(name)
+        if row is None:
+            index.remove(name)
+        elif name in index.ids:
+            index.update(name, row_values(pieces, row))
+        else:
+            index.add(name, row_values(pieces, row))
+
+    def search(self, query, tabs=None):
+        # {tab: [names]} of the pieces whose path contains every word of query, in the order they
+        # were indexed; None for an empty query
+        tokens = query.lower().split()
+        if not tokens:
+            return None
+        matches = {}
+        for tab in self.tables if tabs is None else tabs:
+            found = self.index(tab).search(tokens)
+            if found:
+                matches[tab] = found
+        return matches
+
+    def order(self, tab, column, descending=False):
+        # Names of a tab's pieces sorted by one of SORTED_COLUMNS, ties in the order they were indexed
+        return self.index(tab).order(column, descending)
@@ -0,0 +1,89 @@
+import heapq
+import random
+import datetime
+from array import array
+
+from . import metrics
+from .allocation import MIN_PIECE_MINUTES, allocate
+from .pieces import NEVER_PRACTICED
+
+STALE_DAYS = 2
+PRACTICE_TIME_THRESHOLD = 1200
+
+
+def stale_cutoff(now):
+    # A piece is stale when more than two days passed since the midnight of its last practice day,
+    # which for ordinals means: last practiced < cutoff
+    cutoff = now.toordinal() - STALE_DAYS
+    if now.time() != datetime.time():
+        cutoff += 1
+    return cutoff
+
+
+def priority_column(minutes, last_practiced, proficiency, now=None, last_ends=None):
+    # last_ends optionally holds the end of each piece's last practice from a PracticeHistory (epoch
+    # seconds, None without events). The later of that and the table's day decides staleness: the
+    # history is exact to the second, the table may hold practice merged from other processes since
+    # the history was loaded. A table saying "Never" (e.g. after a reset) wins over the history.
+    if now is None:
+        now = datetime.datetime.now()
+    cutoff = stale_cutoff(now)
+    if last_ends is None:
+        return array("d", [(4 if last == NEVER_PRACTICED else
+                            (3 if total < PRACTICE_TIME_THRESHOLD else 2) if last < cutoff else
+                            1) / level
+                           for total, last, level in zip(minutes, last_practiced, proficiency)])
+    stale_end = now.timestamp() - STALE_DAYS * 86400
+    return array("d", [(4 if last == NEVER_PRACTICED else
+                        (3 if total < PRACTICE_TIME_THRESHOLD else 2)
+                        if last < cutoff and (end is None or end < stale_end) else
+                        1) / level
+                       for total, last, level, end in zip(minutes, last_practiced, proficiency, last_ends)])
+
+
+def top_k(priorities, k, rng=None):
+    # Same ordering as a full sort by (priority, random()) keeping the last k entries,
+    # without sorting the whole library
+    if rng is None:
+        rng = random
+    selected = heapq.nlargest(k, range(len(priorities)), key=lambda i: (priorities[i], rng.random()))
+    selected.reverse()
+    return selected
+
+
+def max_pieces(time, total_pieces, step=1):
+    # MIN_PIECE_MINUTES per piece at least, and a whole step of the allocation
+    return min(time // max(step, MIN_PIECE_MINUTES), total_pieces)
+
+
+@metrics.timed("select_pieces")
+def select_pieces(pieces, num_pieces, time, rng=None, now=None, candidates=None, bounds=None, history=None):
+    # candidates optionally narrows the search to the given names, e.g. prefiltered by SqliteStorage;
+    # bounds are passed to allocate (minimum, maximum, step). With a history every piece's last
+    # practice end is one lookup in its aggregates.
+    if candidates is not None:
+        rows = [row for row in map(pieces.find, candidates) if row is not None]
+        if len(rows) < len(candidates):
+            # The database has names this table does not (removed by another process meanwhile), so
+            # its prefilter no longer matches the table; the whole table is ranked instead
+            candidates = None
+    if candidates is None:
+        rows = range(len(pieces))
+        columns = (pieces.minutes, pieces.last_practiced, pieces.proficiency)
+    else:
+        columns = ([pieces.minutes[i] for i in rows],
+                   [pieces.last_practiced[i] for i in rows],
+                   [pieces.proficiency[i] for i in rows])
+    last_ends = None if not history else [history.last_practiced(pieces.names[i]) for i in rows]
+    priorities = priority_column(*columns, now=now, last_ends=last_ends)
+    selected_pieces = [(pieces.names[rows[i]], priorities[i]) for i in top_k(priorities, num_pieces, rng)]
+    practice_time_list = allocate([piece[1] for piece in selected_pieces], time, **(bounds or {}))
+    return [{"Name": selected_pieces[i][0], "Time": practice_time_list[i]}
+            for i in range(len(selected_pieces)) if practice_time_list[i]]
+
+
+def assess_priority(pieces, row, now=None, history=None):
+    # Priority of one piece, by the same rules as a session's selection
+    last_ends = None if history is None else [history.last_practiced(pieces.names[row])]
+    return priority_column([pieces.minutes[row]], [pieces.last_practiced[row]], [pieces.proficiency[row]],
+                           now=now, last_ends=last_ends)[0]
@@ -0,0 +1,110 @@
+import time
+from collections import namedtuple
+from math import ceil
+
+PracticeRecord = namedtuple("PracticeRecord", ["name", "planned_minutes", "seconds", "started_at", "session"])
+
+
+def practiced_minutes(seconds):
+    # Any started minute counts, as it did when the piece countdown was kept in whole seconds
+    return ceil(int(seconds) / 60)
+
+
+class StudySession:
+    # Session timing derived from a monotonic clock instead of counting timer ticks, so a stalled
+    # event loop delays the display but never the time that is credited. Everything is measured in
+    # "active" seconds: clock time minus the time spent paused.
+    def __init__(self, pieces, minutes, session=0, clock=time.monotonic, wall_clock=time.time):
+        self.pieces = list(pieces)
+        self.session_seconds = minutes * 60
+        self.session = session
+        self.clock = clock
+        self.wall_clock = wall_clock
+        self.index = 0
+        self.active_before = 0.0
+        self.running_since = None
+        self.piece_started = 0.0
+        self.skipped_seconds = 0.0
+        self.records = []
+
+    @property
+    def paused(self):
+        return self.running_since is None
+
+    @property
+    def finished(self):
+        return self.index >= len(self.pieces)
+
+    def start(self):
+        self.resume()
+
+    def pause(self):
+        if self.running_since is not None:
+            self.active_before += self.clock() - self.running_since
+            self.running_since = None
+
+    def resume(self):
+        if self.running_since is None and not self.finished:
+            self.running_since = self.clock()
+
+    def elapsed(self):
+        if self.running_since is None:
+            return self.active_before
+        return self.active_before + self.clock() - self.running_since
+
+    def current(self):
+        return None if self.finished else self.pieces[self.index]
+
+    def piece_end(self):
+        return self.piece_started + self.current()["Time"] * 60
+
+    def remaining_piece_seconds(self):
+        if self.finished:
+            return 0.0
+        return max(0.0, self.piece_end() - self.elapsed())
+
+    def remaining_session_seconds(self):
+        return max(0.0, self.session_seconds - self.elapsed() - self.skipped_seconds)
+
+    def advance(self):
+        # Closes every piece whose planned time is over, even several after a long stall; each next
+        # piece starts exactly where the previous one ended
+        finished = []
+        elapsed = self.elapsed()
+        while not self.finished and elapsed >= self.piece_end():
+            end = self.piece_end()
+            finished.append(self.close(end))
+            self.piece_started = end
+        if self.finished:
+            self.pause()
+        return finished
+
+    def skip(self):
+        # Returns the records closed by this call: pieces that ran out before it plus the skipped one
+        finished = self.advance()
+        if self.finished:
+            return finished
+        elapsed = self.elapsed()
+        self.skipped_seconds += self.piece_end() - elapsed
+        finished.append(self.close(elapsed))
+        self.piece_started = elapsed
+        if self.finished:
+            self.pause()
+        return finished
+
+    def stop(self):
+        finished = self.advance()
+        if not self.finished:
+            finished.append(self.close(self.elapsed()))
+            self.index = len(self.pieces)
+        self.pause()
+        return finished
+
+    def close(self, end):
+        piece = self.current()
+        # Wall clock start, for the practice history; pauses inside the piece are not subtracted
+        started_at = self.wall_clock() - (self.elapsed() - self.piece_started)
+        record = PracticeRecord(piece["Name"], piece["Time"], end - self.piece_started, started_at, self.session)
+        self.records.append(record)
+        self.index += 1
+        return record
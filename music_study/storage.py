@@ -0,0 +1,625 @@
+import csv
+import os
+import sys
+import glob
+import json
+import mmap
+import struct
+import sqlite3
+import datetime
+from array import array
+from contextlib import closing
+from functools import lru_cache
+from itertools import accumulate
+
+from . import metrics
+from .locking import LOCK_TIMEOUT_S, file_lock, read_stamp, write_stamp
+from .pieces import NEVER_PRACTICED, TABLE_COLUMNS, PieceStore, date_ordinal, date_text
+from .scheduling import DEFAULT_SCHEDULER
+from .selection import PRACTICE_TIME_THRESHOLD, stale_cutoff
+from .validation import ValidationReport, validate_rows
+
+# Rows per chunk handed over by the background loader
+LOAD_CHUNK_ROWS = 5000
+# The journal is folded back into the CSV snapshot once it holds this many entries,
+# or more entries than a quarter of the tab, whichever is larger
+JOURNAL_COMPACTION_MIN_ENTRIES = 500
+# "csv" keeps one data_N.csv per tab, "snapshot" also keeps a binary data_N.snap copy of every CSV
+# snapshot to load from, "sqlite" keeps every tab in data/library.db
+STORAGE_BACKEND = os.environ.get("MUSIC_STUDY_STORAGE", "csv")
+
+# The data folder lives next to main.py, one level above this package
+executable_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+folder_name = "data"
+output_folder_path = os.path.join(executable_dir, folder_name)
+database_file_name = "library.db"
+# Per tab options that do not belong to either backend,
+# e.g. {"3": {"scheduler": "sm2", "folders": ["/home/anna/scores"]}}
+settings_file_name = "tabs.json"
+
+
+def generate_csv(index, folder=output_folder_path):
+    os.makedirs(folder, exist_ok=True)
+    file_name = f"data_{index}.csv"
+    file_path = os.path.join(folder, file_name)
+    with open(file_path, "a", newline="") as csv_file:
+        pass
+    return file_path
+
+
+def write_csv(file_path, data):
+    with open(file_path, "w", newline="") as csv_file:
+        writer = csv.DictWriter(csv_file, fieldnames=TABLE_COLUMNS)
+        writer.writeheader()
+        for row in data.rows():
+            writer.writerow(row)
+        csv_file.flush()
+        os.fsync(csv_file.fileno())
+
+
+@metrics.timed("save_csv")
+def save_csv(file_path, data):
+    # Written next to the target and renamed over it, so a crash never leaves a half written snapshot
+    write_csv(f"{file_path}.tmp", data)
+    os.replace(f"{file_path}.tmp", file_path)
+
+
+# magic, array item size, byte order, pieces, CSV size and mtime (ns), string table bytes. The columns
+# follow in the layout of PieceStore's arrays on this machine: minutes, date added, last practiced and
+# the end of each name in the string table as item size wide integers, then proficiency as bytes and
+# the string table, every name in UTF-8 followed by a NUL.
+SNAPSHOT_HEADER = struct.Struct("<8sBBxxIqqQ")
+SNAPSHOT_MAGIC = b"MSSNAP01"
+SNAPSHOT_BYTE_ORDER = 0 if sys.byteorder == "little" else 1
+SNAPSHOT_ITEM_SIZE = array("l").itemsize
+SNAPSHOT_WIDTHS = (SNAPSHOT_ITEM_SIZE, SNAPSHOT_ITEM_SIZE, SNAPSHOT_ITEM_SIZE, SNAPSHOT_ITEM_SIZE, 1)
+
+
+def snapshot_path(file_path):
+    return f"{os.path.splitext(file_path)[0]}.snap"
+
+
+def snapshot_source(file_path):
+    status = os.stat(file_path)
+    return status.st_size, status.st_mtime_ns
+
+
+@metrics.timed("save_snapshot")
+def save_snapshot(file_path, data, source_path):
+    # Records the size and mtime of the CSV it was made from; once the CSV changes the snapshot is stale
+    names = [name.encode("utf-8", "surrogatepass") + b"\0" for name in data.names]
+    ends = array("l", accumulate(len(name) for name in names))
+    temp_path = f"{file_path}.tmp"
+    with open(temp_path, "wb") as snapshot_file:
+        snapshot_file.write(SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_ITEM_SIZE, SNAPSHOT_BYTE_ORDER, len(data),
+                                                 *snapshot_source(source_path), ends[-1] if ends else 0))
+        for column in (data.minutes, data.date_added, data.last_practiced, ends, data.proficiency):
+            column.tofile(snapshot_file)
+        snapshot_file.write(b"".join(names))
+        snapshot_file.flush()
+        os.fsync(snapshot_file.fileno())
+    os.replace(temp_path, file_path)
+
+
+def open_snapshot(file_path, source_path):
+    # Returns (mapped file, pieces), or None when the snapshot is missing, was written on a machine
+    # with other array layouts, or no longer matches the CSV
+    try:
+        with open(file_path, "rb") as snapshot_file:
+            mapped = mmap.mmap(snapshot_file.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError):
+        return None
+    try:
+        magic, item_size, byte_order, count, *source, names_length = SNAPSHOT_HEADER.unpack_from(mapped)
+        if (magic == SNAPSHOT_MAGIC and item_size == SNAPSHOT_ITEM_SIZE and byte_order == SNAPSHOT_BYTE_ORDER
+                and tuple(source) == snapshot_source(source_path)
+                and len(mapped) == SNAPSHOT_HEADER.size + count * sum(SNAPSHOT_WIDTHS) + names_length):
+            return mapped, count
+    except (OSError, struct.error):
+        pass
+    mapped.close()
+    return None
+
+
+def snapshot_chunks(mapped, count, chunk_rows=LOAD_CHUNK_ROWS):
+    # Yields (PieceStore chunk, progress 0-1) like reading the CSV. Each chunk copies its slice of
+    # every column straight out of the mapped file and decodes only its own names; the map is
+    # closed when the generator ends or is closed.
+    starts = [SNAPSHOT_HEADER.size]
+    for width in SNAPSHOT_WIDTHS:
+        starts.append(starts[-1] + width * count)
+    minutes, date_added, last_practiced, ends, proficiency, names = starts
+    try:
+        with memoryview(mapped) as view, view[ends:proficiency].cast("l") as name_ends:
+            for first in range(0, count, chunk_rows):
+                last = min(first + chunk_rows, count)
+                text = str(view[names + (name_ends[first - 1] if first else 0):names + name_ends[last - 1]],
+                           "utf-8", "surrogatepass")
+                chunk = PieceStore()
+                chunk.extend_columns(text.split("\0")[:-1],
+                                     *(view[start + SNAPSHOT_ITEM_SIZE * first:start + SNAPSHOT_ITEM_SIZE * last]
+                                       for start in (minutes, date_added, last_practiced)),
+                                     view[proficiency + first:proficiency + last])
+                metrics.count("rows_loaded", len(chunk))
+                yield chunk, last / count
+    finally:
+        mapped.close()
+
+
+def journal_path(file_path):
+    return f"{os.path.splitext(file_path)[0]}.journal"
+
+
+def append_journal(file_path, data, changes):
+    # One line per changed piece: "set" carries the whole row, "delete" only the name and "update"
+    # the field updates (practice minutes added, last practice day, new proficiency or empty)
+    with open(file_path, "a", newline="") as journal_file:
+        writer = csv.writer(journal_file)
+        for name, operation in changes.items():
+            if operation == "delete":
+                writer.writerow(["delete", name])
+            elif operation == "set":
+                row = data.row(data.find(name))
+                writer.writerow(["set"] + [row[column] for column in TABLE_COLUMNS])
+            else:
+                writer.writerow(["update", name, operation.get("minutes", 0),
+                                 date_text(operation.get("last_practiced", NEVER_PRACTICED)),
+                                 operation.get("proficiency", "")])
+        journal_file.flush()
+        os.fsync(journal_file.fileno())
+    return len(changes)
+
+
+def journal_update(record):
+    fields = {"minutes": int(record[2]), "last_practiced": date_ordinal(record[3])}
+    if record[4]:
+        fields["proficiency"] = int(record[4])
+    return fields
+
+
+def read_journal(file_path):
+    # Returns the journal records and whether the journal ended cleanly; a torn last line left by
+    # a crash is dropped
+    if not os.path.exists(file_path):
+        return [], True
+    with open(file_path, mode="r", newline="") as journal_file:
+        content = journal_file.read()
+    clean = not content or content.endswith("\n")
+    lines = content.splitlines(keepends=True)
+    if not clean:
+        lines.pop()
+    return list(csv.reader(lines)), clean
+
+
+def apply_journal(records, data):
+    # Returns the number of applied entries and whether all of them were valid; a malformed record
+    # stops the replay
+    entries = 0
+    for record in records:
+        try:
+            if record[0] == "delete" and len(record) == 2:
+                data.discard(record[1])
+            elif record[0] == "set" and len(record) == len(TABLE_COLUMNS) + 1:
+                data.upsert_row(dict(zip(TABLE_COLUMNS, record[1:])))
+            elif record[0] == "update" and len(record) == 5:
+                data.apply_update(record[1], journal_update(record))
+            else:
+                raise ValueError
+        except (ValueError, IndexError):
+            return entries, False
+        entries += 1
+    return entries, True
+
+
+def replay_journal(file_path, data):
+    records, clean = read_journal(file_path)
+    entries, valid = apply_journal(records, data)
+    return entries, clean and valid
+
+
+def compaction_due(entries, data):
+    return entries > max(JOURNAL_COMPACTION_MIN_ENTRIES, len(data) // 4)
+
+
+def csv_tab_numbers(folder=output_folder_path):
+    pattern = os.path.join(folder, 'data_*.csv')
+    return [int(os.path.basename(file).split(".")[0].split("_")[-1]) for file in glob.glob(pattern)]
+
+
+class CsvStorage:
+    # data_N.csv snapshot plus data_N.journal with the changes saved since the last compaction.
+    # Several processes can share a tab: every read and write holds data_N.lock, and data_N.version
+    # counts the writes, so a save notices when another process wrote since this one last looked.
+    # With snapshot set every compaction also writes data_N.snap, which loads without parsing; the CSV
+    # stays the file to exchange and edit, and the snapshot is rebuilt whenever it no longer matches it.
+    def __init__(self, file_path, snapshot=False):
+        self.file_path = file_path
+        base = os.path.splitext(file_path)[0]
+        self.snapshot = snapshot
+        self.snapshot_path = snapshot_path(file_path)
+        self.snapshot_stale = False
+        self.journal_path = journal_path(file_path)
+        # The journal while a compaction folds it into the CSV
+        self.compacting_path = f"{self.journal_path}.compacting"
+        self.lock_path = f"{base}.lock"
+        self.version_path = f"{base}.version"
+        self.journal_entries = 0
+        # (records, clean) read with the snapshot, until replayed
+        self.journal = None
+        self.version = None
+
+    def load(self, data, report, compact=True):
+        # Returns False when the file does not have the expected columns. With compact unset the
+        # files are only read, even when the load repaired rows or found a stale snapshot.
+        with file_lock(self.lock_path):
+            return self.read(data, report, compact)
+
+    def read(self, data, report, compact=True):
+        for chunk, _ in self.read_chunks(report):
+            data.extend(chunk)
+        return self.replay(data, report, compact)
+
+    def stream(self, report, chunk_rows=LOAD_CHUNK_ROWS):
+        # load() in steps, for loading in the background: yields (PieceStore chunk, progress 0-1) for
+        # the snapshot rows; finish_load() then replays the journal, which is read together with the
+        # snapshot under one lock hold. Closing the generator early releases the lock.
+        with file_lock(self.lock_path):
+            yield from self.read_chunks(report, chunk_rows)
+
+    def read_chunks(self, report, chunk_rows=LOAD_CHUNK_ROWS):
+        self.recover()
+        self.journal = None
+        self.version = read_stamp(self.version_path)
+        snapshot = open_snapshot(self.snapshot_path, self.file_path) if self.snapshot else None
+        # A missing or outdated binary snapshot is written again once the load is complete
+        self.snapshot_stale = self.snapshot and snapshot is None
+        if snapshot is None:
+            yield from self.read_csv_chunks(report, chunk_rows)
+            return
+        with metrics.span("snapshot_load"):
+            yield from snapshot_chunks(*snapshot, chunk_rows)
+            self.journal = read_journal(self.journal_path)
+
+    def read_csv_chunks(self, report, chunk_rows=LOAD_CHUNK_ROWS):
+        with metrics.span("csv_load"):
+            size = os.path.getsize(self.file_path) or 1
+            with open(self.file_path, mode='r') as csv_file:
+                csv_reader = csv.DictReader(csv_file)
+                column_names = csv_reader.fieldnames
+                if column_names == TABLE_COLUMNS:
+                    chunk = PieceStore()
+                    for row in validate_rows(csv_reader, report):
+                        chunk.append_row(row)
+                        if len(chunk) == chunk_rows:
+                            chunk.take_changes()
+                            metrics.count("rows_loaded", len(chunk))
+                            # The byte offset of the underlying buffer runs slightly ahead of the parser
+                            yield chunk, min(1.0, csv_file.buffer.tell() / size)
+                            chunk = PieceStore()
+                    if len(chunk):
+                        chunk.take_changes()
+                        metrics.count("rows_loaded", len(chunk))
+                        yield chunk, 1.0
+                elif column_names:
+                    return
+            # Changes journaled after the last compaction (or before a crash) are applied on top of the snapshot
+            self.journal = read_journal(self.journal_path)
+
+    def finish_load(self, data, report):
+        # Returns False when the file does not have the expected columns
+        with file_lock(self.lock_path):
+            if read_stamp(self.version_path) != self.version:
+                # Written since the stream; the next save merges, and a compaction now would lose it
+                return self.replay(data, report, compact=False)
+            return self.replay(data, report)
+
+    def replay(self, data, report, compact=True):
+        if self.journal is None:
+            return False
+        records, clean = self.journal
+        self.journal = None
+        self.journal_entries, valid = apply_journal(records, data)
+        data.take_changes()
+        if compact and (report or not clean or not valid or self.snapshot_stale):
+            self.write_snapshot(data)
+        return True
+
+    @metrics.timed("csv_save")
+    def save(self, data):
+        # Returns True when data was refreshed with changes other processes saved meanwhile. Those are
+        # merged row by row: this process's changes are replayed on top of a fresh read, practice
+        # minutes add up and the latest practice day wins, so no process's practice is ever lost.
+        with file_lock(self.lock_path):
+            refreshed = read_stamp(self.version_path) != self.version
+            if refreshed:
+                self.refresh(data)
+            changes = data.take_changes()
+            if changes:
+                self.journal_entries += append_journal(self.journal_path, data, changes)
+                self.bump()
+            if compaction_due(self.journal_entries, data):
+                self.write_snapshot(data)
+        return refreshed
+
+    def refresh(self, data):
+        changes = data.take_changes()
+        rows = {name: data.row(data.find(name)) for name, change in changes.items() if change == "set"}
+        fresh = PieceStore()
+        if not self.read(fresh, ValidationReport()):
+            # Someone replaced the file with something unreadable; the save rewrites it from this copy
+            data.changes = changes
+            return
+        fresh.apply_changes(changes, rows)
+        data.assign(fresh)
+
+    def compact(self, data):
+        # Only the latest rows may become the snapshot, so pending changes are saved (and merged) first
+        with file_lock(self.lock_path):
+            if read_stamp(self.version_path) != self.version or data.changes:
+                self.refresh(data)
+                data.take_changes()
+            self.write_snapshot(data)
+
+    def write_snapshot(self, data):
+        # Journal updates are deltas, so they must never be replayed on a CSV they are already folded
+        # into. The new CSV is complete in data_N.csv.tmp before the journal is moved aside, and the
+        # moved journal is removed only after the CSV was replaced; recover() rolls a compaction that
+        # a crash interrupted forward from either step.
+        self.recover()
+        temp_path = f"{self.file_path}.tmp"
+        with metrics.span("save_csv"):
+            write_csv(temp_path, data)
+        if os.path.exists(self.journal_path):
+            os.replace(self.journal_path, self.compacting_path)
+        os.replace(temp_path, self.file_path)
+        if os.path.exists(self.compacting_path):
+            os.remove(self.compacting_path)
+        if self.snapshot:
+            save_snapshot(self.snapshot_path, data, self.file_path)
+            self.snapshot_stale = False
+        data.take_changes()
+        self.journal_entries = 0
+        self.bump()
+
+    def recover(self):
+        # Called with the lock held, before the CSV is read or written
+        if not os.path.exists(self.compacting_path):
+            return
+        temp_path = f"{self.file_path}.tmp"
+        if os.path.exists(temp_path):
+            # Stopped before the replace: the new CSV, with the moved journal folded in, is complete
+            os.replace(temp_path, self.file_path)
+        os.remove(self.compacting_path)
+
+    def bump(self):
+        self.version = read_stamp(self.version_path) + 1
+        write_stamp(self.version_path, self.version)
+
+    def candidates(self, num_pieces, now=None):
+        return None
+
+
+@lru_cache(maxsize=None)
+def open_database(path):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    new_database = not os.path.exists(path)
+    # Other processes may hold the write lock for a moment; waiting beats failing the save
+    connection = sqlite3.connect(path, timeout=LOCK_TIMEOUT_S)
+    connection.executescript("""
+        CREATE TABLE IF NOT EXISTS tabs (number INTEGER PRIMARY KEY, version INTEGER NOT NULL DEFAULT 0);
+        CREATE TABLE IF NOT EXISTS pieces (
+            tab INTEGER NOT NULL REFERENCES tabs (number),
+            name TEXT NOT NULL,
+            minutes INTEGER NOT NULL DEFAULT 0,
+            date_added INTEGER NOT NULL,
+            last_practiced INTEGER NOT NULL DEFAULT 0,
+            proficiency INTEGER NOT NULL DEFAULT 1,
+            PRIMARY KEY (tab, name)
+        );
+        CREATE INDEX IF NOT EXISTS pieces_last_practiced ON pieces (tab, last_practiced);
+        CREATE INDEX IF NOT EXISTS pieces_proficiency ON pieces (tab, proficiency);
+        CREATE INDEX IF NOT EXISTS pieces_minutes ON pieces (tab, minutes);
+    """)
+    if "version" not in [column[1] for column in connection.execute("PRAGMA table_info(tabs)")]:
+        # Databases from before version stamps
+        with connection:
+            connection.execute("ALTER TABLE tabs ADD COLUMN version INTEGER NOT NULL DEFAULT 0")
+    if new_database:
+        import_csv_tabs(connection, os.path.dirname(path))
+    return connection
+
+
+def sqlite_tab_numbers(connection):
+    return [number for number, in connection.execute("SELECT number FROM tabs ORDER BY number")]
+
+
+class SqliteStorage:
+    # One row per piece in a shared database, keyed by (tab, name); rowid keeps the insertion order
+    PRIORITY_SQL = """
+        CASE WHEN last_practiced = 0 THEN 4.0
+             WHEN last_practiced < :cutoff THEN CASE WHEN minutes < :threshold THEN 3.0 ELSE 2.0 END
+             ELSE 1.0 END / proficiency
+    """
+
+    def __init__(self, connection, number):
+        self.connection = connection
+        self.path = connection.execute("PRAGMA database_list").fetchone()[2]
+        self.number = number
+        self.version = None
+        with self.connection:
+            self.connection.execute("INSERT OR IGNORE INTO tabs (number) VALUES (?)", (number,))
+
+    def load(self, data, report, compact=True):
+        for chunk, _ in self.stream(report):
+            data.extend(chunk)
+        return self.finish_load(data, report)
+
+    def stream(self, report, chunk_rows=LOAD_CHUNK_ROWS):
+        # Same steps as CsvStorage.stream(). Runs on its own connection, as sqlite3 connections stay
+        # in the thread that made them, inside one read transaction so the rows and the version match.
+        with closing(sqlite3.connect(self.path, timeout=LOCK_TIMEOUT_S)) as connection, metrics.span("sqlite_load"):
+            connection.execute("BEGIN")
+            self.version = connection.execute("SELECT version FROM tabs WHERE number = ?",
+                                              (self.number,)).fetchone()[0]
+            total = connection.execute("SELECT COUNT(*) FROM pieces WHERE tab = ?", (self.number,)).fetchone()[0]
+            rows = connection.execute("SELECT name, minutes, date_added, last_practiced, proficiency "
+                                      "FROM pieces WHERE tab = ? ORDER BY rowid", (self.number,))
+            loaded = 0
+            for batch in iter(lambda: rows.fetchmany(chunk_rows), []):
+                chunk = PieceStore()
+                for row in batch:
+                    chunk.append(*row)
+                chunk.take_changes()
+                metrics.count("rows_loaded", len(chunk))
+                loaded += len(chunk)
+                yield chunk, loaded / total
+
+    def finish_load(self, data, report):
+        return True
+
+    def read_version(self):
+        return self.connection.execute("SELECT version FROM tabs WHERE number = ?", (self.number,)).fetchone()[0]
+
+    @metrics.timed("sqlite_save")
+    def save(self, data):
+        # Returns True when data was reloaded because another process saved this tab meanwhile. Field
+        # updates are applied as increments in the database, under SQLite's write lock, so concurrent
+        # practice from several processes adds up instead of the last save winning.
+        changes = data.take_changes()
+        deleted = []
+        updated = []
+        practiced = []
+        for name, operation in changes.items():
+            if operation == "delete":
+                deleted.append((self.number, name))
+            elif operation == "set":
+                row = data.find(name)
+                updated.append((self.number, name, data.minutes[row], data.date_added[row],
+                                data.last_practiced[row], data.proficiency[row]))
+            else:
+                practiced.append((operation.get("minutes", 0), operation.get("last_practiced", NEVER_PRACTICED),
+                                  operation.get("proficiency"), self.number, name))
+        try:
+            with self.connection:
+                self.connection.execute("BEGIN IMMEDIATE")
+                version = self.read_version()
+                self.connection.executemany("DELETE FROM pieces WHERE tab = ? AND name = ?", deleted)
+                self.connection.executemany("""
+                    INSERT INTO pieces (tab, name, minutes, date_added, last_practiced, proficiency)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                    ON CONFLICT (tab, name) DO UPDATE SET minutes = excluded.minutes,
+                                                          date_added = excluded.date_added,
+                                                          last_practiced = excluded.last_practiced,
+                                                          proficiency = excluded.proficiency
+                """, updated)
+                self.connection.executemany("""
+                    UPDATE pieces SET minutes = minutes + ?, last_practiced = MAX(last_practiced, ?),
+                                      proficiency = COALESCE(?, proficiency)
+                    WHERE tab = ? AND name = ?
+                """, practiced)
+                if changes:
+                    self.connection.execute("UPDATE tabs SET version = ? WHERE number = ?", (version + 1, self.number))
+        except sqlite3.Error:
+            for name, operation in changes.items():
+                data.changes.setdefault(name, operation)
+            raise
+        refreshed = version != self.version
+        self.version = version + 1 if changes else version
+        if refreshed:
+            fresh = PieceStore()
+            self.load(fresh, ValidationReport())
+            data.assign(fresh)
+        return refreshed
+
+    def compact(self, data):
+        self.save(data)
+
+    def candidates(self, num_pieces, now=None):
+        # Names of every piece whose priority ties or beats the num_pieces-th best one, so the
+        # random tie-break still happens in select_pieces
+        if now is None:
+            now = datetime.datetime.now()
+        parameters = {"tab": self.number, "cutoff": stale_cutoff(now),
+                      "threshold": PRACTICE_TIME_THRESHOLD, "offset": num_pieces - 1}
+        query = f"""
+            WITH ranked AS (SELECT name, {self.PRIORITY_SQL} AS priority FROM pieces WHERE tab = :tab)
+            SELECT name FROM ranked
+            WHERE priority >= COALESCE((SELECT priority FROM ranked ORDER BY priority DESC
+                                        LIMIT 1 OFFSET :offset), 0)
+        """
+        return [name for name, in self.connection.execute(query, parameters)]
+
+
+def import_csv_tabs(connection, folder=output_folder_path):
+    reports = {}
+    for number in csv_tab_numbers(folder):
+        data = PieceStore()
+        reports[number] = ValidationReport()
+        if CsvStorage(generate_csv(number, folder)).load(data, reports[number]):
+            for name in data.names:
+                data.changes[name] = "set"
+            SqliteStorage(connection, number).save(data)
+    return reports
+
+
+def export_csv_tab(connection, number, file_path):
+    data = PieceStore()
+    SqliteStorage(connection, number).load(data, ValidationReport())
+    save_csv(file_path, data)
+
+
+def open_storage(number, folder=output_folder_path, backend=STORAGE_BACKEND):
+    if backend == "sqlite":
+        return SqliteStorage(open_database(os.path.join(folder, database_file_name)), number)
+    return CsvStorage(generate_csv(number, folder), snapshot=backend == "snapshot")
+
+
+def tab_numbers(folder=output_folder_path, backend=STORAGE_BACKEND):
+    if backend == "sqlite":
+        return sqlite_tab_numbers(open_database(os.path.join(folder, database_file_name)))
+    return csv_tab_numbers(folder)
+
+
+def history_prefix(number, folder=output_folder_path):
+    return os.path.join(folder, f"history_{number}")
+
+
+def index_path(number, folder=output_folder_path):
+    return os.path.join(folder, f"index_{number}.json")
+
+
+def tab_settings(folder=output_folder_path):
+    try:
+        with open(os.path.join(folder, settings_file_name)) as settings_file:
+            return json.load(settings_file)
+    except (OSError, ValueError):
+        return {}
+
+
+def tab_options(number, folder=output_folder_path):
+    return tab_settings(folder).get(str(number), {})
+
+
+def tab_scheduler(number, folder=output_folder_path):
+    return tab_options(number, folder).get("scheduler", DEFAULT_SCHEDULER)
+
+
+def set_tab_option(number, key, value, folder=output_folder_path):
+    settings_path = os.path.join(folder, settings_file_name)
+    # Read, changed and written under one lock, so processes changing different options keep both
+    with file_lock(f"{settings_path}.lock"):
+        settings = tab_settings(folder)
+        settings.setdefault(str(number), {})[key] = value
+        with open(f"{settings_path}.tmp", "w") as settings_file:
+            json.dump(settings, settings_file, indent=2)
+        os.replace(f"{settings_path}.tmp", settings_path)
+
+
+def load_tab(number, folder=output_folder_path, backend=STORAGE_BACKEND, compact=True):
+    # Headless counterpart of Tab.loadData; returns None when the tab file is corrupted. Callers
+    # that only read pass compact=False, so repaired rows are not written back to the tab.
+    data = PieceStore()
+    report = ValidationReport()
+    if not open_storage(number, folder, backend).load(data, report, compact):
+        return None, report
+    return data, report
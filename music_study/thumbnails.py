@@ -0,0 +1,94 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+THUMBNAIL_CACHE_BYTES = 256 * 1024 * 1024
+THUMBNAIL_FOLDER_NAME = "thumbnails"
+
+
+def preview_key(path, kind, size, digest=None):
+    # Content addressed when the library index knows the file's hash, so copies and moved files share
+    # their previews; otherwise the path, size and modification time stand in for the content. Either
+    # way an edited file gets a new key, and its old previews simply age out.
+    if digest is None:
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        digest = f"{path}|{stat.st_size}|{stat.st_mtime_ns}"
+    return hashlib.blake2b(f"{digest}|{kind}|{size}".encode(), digest_size=16).hexdigest()
+
+
+class DiskCache:
+    # Size bounded LRU of small files (encoded previews) under one folder, shared by every tab and
+    # kept between runs. The folder is listed once; afterwards sizes and the use order are tracked in
+    # memory, and the access time of a file is only bumped when it is read, for the next run's order.
+    # Thread safe, as previews are written from render workers.
+    def __init__(self, folder, max_bytes=THUMBNAIL_CACHE_BYTES):
+        self.folder = folder
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.size = 0
+        self.files = None
+
+    def __contains__(self, key):
+        with self.lock:
+            if self.files is None:
+                self.scan()
+            return key in self.files
+
+    def path(self, key):
+        return os.path.join(self.folder, key[:2], key)
+
+    def scan(self):
+        entries = []
+        for root, _, names in os.walk(self.folder):
+            for name in names:
+                if name.endswith(".tmp"):
+                    continue
+                try:
+                    stat = os.stat(os.path.join(root, name))
+                except OSError:
+                    continue
+                entries.append((max(stat.st_atime, stat.st_mtime), name, stat.st_size))
+        self.files = OrderedDict((name, size) for _, name, size in sorted(entries))
+        self.size = sum(self.files.values())
+
+    def get(self, key):
+        with self.lock:
+            if self.files is None:
+                self.scan()
+            if key not in self.files:
+                return None
+            self.files.move_to_end(key)
+        try:
+            with open(self.path(key), "rb") as cached_file:
+                data = cached_file.read()
+            os.utime(self.path(key))
+        except OSError:
+            with self.lock:
+                self.size -= self.files.pop(key, 0)
+            return None
+        return data
+
+    def put(self, key, data):
+        path = self.path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(temp_path, "wb") as cached_file:
+            cached_file.write(data)
+        os.replace(temp_path, path)
+        with self.lock:
+            if self.files is None:
+                self.scan()
+            else:
+                self.size += len(data) - self.files.pop(key, 0)
+                self.files[key] = len(data)
+            while self.size > self.max_bytes and len(self.files) > 1:
+                evicted, size = self.files.popitem(last=False)
+                self.size -= size
+                try:
+                    os.remove(self.path(evicted))
+                except OSError:
+                    pass
@@ -0,0 +1,92 @@
+import csv
+from collections import Counter, namedtuple
+
+from . import metrics
+from .pieces import EXTENSIONS, date_ordinal, date_text, today_ordinal
+
+ValidationIssue = namedtuple("ValidationIssue", ["line", "name", "column", "value", "fix"])
+
+
+class ValidationReport:
+    # Everything checkData found and fixed while loading a tab, collected instead of shown one by one
+    def __init__(self):
+        self.issues = []
+
+    def __len__(self):
+        return len(self.issues)
+
+    def add(self, line, name, column, value, fix):
+        metrics.count("validation_issues")
+        self.issues.append(ValidationIssue(line, name, column, value, fix))
+
+    def counts(self):
+        return Counter(issue.column for issue in self.issues)
+
+    def lines(self):
+        for issue in self.issues:
+            location = f"line {issue.line}: " if issue.line is not None else ""
+            yield f"{location}{issue.name}, column '{issue.column}' had '{issue.value}', {issue.fix}."
+
+    def write_csv(self, file_path):
+        with open(file_path, "w", newline="") as csv_file:
+            writer = csv.writer(csv_file)
+            writer.writerow(["Line", "Name", "Column", "Value", "Fix"])
+            writer.writerows(self.issues)
+
+
+def checkData(row, report, line=None):
+    name = row["Name"]
+    # csv.DictReader fills the columns a short row lacks (the last ones) with None and keeps a long
+    # row's extra fields in a list under None
+    if None in row or row["Proficiency"] is None:
+        fields = sum(value is not None for key, value in row.items() if key is not None) + len(row.get(None, ()))
+        report.add(line, name, "Row", f"{fields} fields", "wrong number of fields, piece removed")
+        return None, True
+    invalid = False
+    for key, value in row.items():
+        if key == "Name":
+            extension = value.split(".")[-1]
+            if extension not in EXTENSIONS:
+                report.add(line, name, key, value, "unsupported extension, piece removed")
+                return None, True
+        elif key == "Total Practice Time (min)":
+            try:
+                time = int(value)
+                if time < 0:
+                    raise ValueError
+            except ValueError:
+                row[key] = '0'
+                report.add(line, name, key, value, f"reset to '{row[key]}'")
+                invalid = True
+        elif key == "Last Practiced" or key == "Date Added":
+            if key == "Last Practiced" and value == "Never":
+                continue
+            try:
+                _ = date_ordinal(value)
+            except ValueError:
+                if key == "Date Added":
+                    row[key] = date_text(today_ordinal())
+                else:
+                    row[key] = "Never"
+                report.add(line, name, key, value, f"reset to '{row[key]}'")
+                invalid = True
+        else:
+            try:
+                proficiency = int(value)
+                if proficiency < 1 or proficiency > 10:
+                    raise ValueError
+            except ValueError:
+                row[key] = "1"
+                report.add(line, name, key, value, f"reset to '{row[key]}'")
+                invalid = True
+    return row, invalid
+
+
+def validate_rows(rows, report):
+    # Headless validation pass: yields the usable rows (fixed where needed) and fills report. Rows
+    # are only timed one by one while metrics are on; otherwise the loop stays as cheap as it was.
+    check = metrics.timed("check_data")(checkData) if metrics.enabled else checkData
+    for line, row in enumerate(rows, start=2):
+        row, _ = check(row, report, line)
+        if row:
+            yield row
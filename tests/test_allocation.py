@@ -0,0 +1,39 @@
+import pytest
+
+from music_study import PieceStore, allocate, max_pieces, plan_week, select_pieces
+
+
+@pytest.mark.parametrize("weights, total, step", [
+    ([1.0, 2.0, 3.0, 4.0], 60, 1),
+    ([4.0, 1.0, 1.0, 1.0, 1.0, 1.0], 60, 15),
+    ([1.0, 2.0, 3.0], 30, 20),
+    ([0.0, 0.0], 25, 5),
+])
+def test_allocate_adds_up(weights, total, step):
+    assert sum(allocate(weights, total, step=step)) == total
+
+
+def test_allocate_gives_the_steps_to_the_largest_weights():
+    assert allocate([1.0, 2.0, 3.0], 30, step=20) == [0, 0, 30]
+    assert allocate([1.0] * 6, 60, step=15) == [15, 15, 15, 15, 0, 0]
+
+
+def test_short_time_is_split_without_empty_pieces():
+    assert sorted(allocate([3.0, 1.0, 2.0], 25)) == [8, 8, 9]
+
+
+def test_max_pieces_counts_whole_steps():
+    assert max_pieces(60, 100) == 6
+    assert max_pieces(60, 100, step=15) == 4
+    assert max_pieces(30, 100, step=20) == 1
+    assert max_pieces(60, 3, step=15) == 3
+
+
+def test_sessions_have_no_piece_without_time():
+    pieces = PieceStore()
+    for i in range(10):
+        pieces.append(f"/library/{i}.pdf")
+    session = select_pieces(pieces, 6, 60, bounds={"step": 15})
+    assert [piece["Time"] for piece in session] == [15, 15, 15, 15]
+    week = plan_week({1: pieces}, [{"tab": 1, "minutes": 30, "pieces": 3}], days=2, bounds={"step": 20})
+    assert all(piece["Time"] == 30 for day in week for piece in day["pieces"])
@@ -0,0 +1,71 @@
+import datetime
+
+from music_study import (PieceStore,
+                         PracticeHistory,
+                         SpacedRepetitionScheduler,
+                         SqliteStorage,
+                         StepScheduler,
+                         assess_priority,
+                         open_database,
+                         select_pieces)
+
+NOW = datetime.datetime(2026, 10, 17, 18, 0)
+TODAY = NOW.toordinal()
+
+
+def history_with(tmp_path, name, end):
+    history = PracticeHistory(str(tmp_path / "history_1")).load()
+    history.append(name, end.timestamp() - 600, 600, 1)
+    return history
+
+
+def test_table_practice_newer_than_the_history_counts(tmp_path):
+    # Practice merged from another process reaches the table but not the loaded history
+    pieces = PieceStore()
+    pieces.append("/a.pdf", minutes=100, last_practiced=TODAY)
+    history = history_with(tmp_path, "/a.pdf", NOW - datetime.timedelta(days=10))
+    assert assess_priority(pieces, 0, NOW, history) == 1.0
+
+
+def test_history_end_keeps_a_piece_fresh_within_two_days(tmp_path):
+    # The table's day is stale by midnights, the exact end of the practice is not
+    pieces = PieceStore()
+    pieces.append("/a.pdf", minutes=100, last_practiced=TODAY - 2)
+    assert assess_priority(pieces, 0, NOW) == 3.0
+    history = history_with(tmp_path, "/a.pdf", datetime.datetime(2026, 10, 15, 23, 0))
+    assert assess_priority(pieces, 0, NOW, history) == 1.0
+
+
+def test_reset_piece_counts_as_never_practiced(tmp_path):
+    pieces = PieceStore()
+    pieces.append("/a.pdf", minutes=0, last_practiced=0)
+    history = history_with(tmp_path, "/a.pdf", NOW - datetime.timedelta(hours=1))
+    assert assess_priority(pieces, 0, NOW, history) == 4.0
+
+
+
+def test_missing_candidates_fall_back_to_the_whole_table():
+    pieces = PieceStore()
+    pieces.append("/a.pdf")
+    pieces.append("/b.pdf", proficiency=5)
+    session = select_pieces(pieces, 1, 30, candidates=["/b.pdf", "/gone.pdf"])
+    assert [piece["Name"] for piece in session] == ["/a.pdf"]
+
+
+def test_sqlite_prefilter_is_skipped_when_the_history_reranks(tmp_path):
+    # /a.pdf is stale by the table's day (3) but was practiced hours ago by the history (1); /b.pdf is 2
+    data = PieceStore()
+    data.append("/a.pdf", minutes=100, last_practiced=TODAY - 5)
+    data.append("/b.pdf", minutes=5000, last_practiced=TODAY - 5)
+    for name in data.names:
+        data.changes[name] = "set"
+    storage = SqliteStorage(open_database(str(tmp_path / "library.db")), 1)
+    storage.save(data)
+    assert storage.candidates(1, NOW) == ["/a.pdf"]
+    history = history_with(tmp_path, "/a.pdf", NOW - datetime.timedelta(hours=3))
+    step = StepScheduler(data, history)
+    assert step.candidates(storage, 1) is None
+    session = step.select(1, 30, now=NOW, candidates=step.candidates(storage, 1))
+    assert [piece["Name"] for piece in session] == ["/b.pdf"]
+    assert StepScheduler(data, PracticeHistory(str(tmp_path / "empty"))).candidates(storage, 1) is not None
+    assert SpacedRepetitionScheduler(data, history).candidates(storage, 1) is None
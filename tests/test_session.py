@@ -0,0 +1,77 @@
+from music_study import StudySession, practiced_minutes
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+    def tick(self, seconds):
+        self.now += seconds
+
+
+def session_with(*minutes):
+    clock = FakeClock()
+    pieces = [{"Name": f"/piece_{i}.pdf", "Time": time} for i, time in enumerate(minutes)]
+    session = StudySession(pieces, sum(minutes), session=7, clock=clock, wall_clock=lambda: 50000.0)
+    session.start()
+    return session, clock
+
+
+def test_pause_stops_the_piece_and_session_countdown():
+    session, clock = session_with(2, 3)
+    clock.tick(30)
+    session.pause()
+    clock.tick(600)
+    assert session.paused
+    assert session.elapsed() == 30
+    assert session.remaining_piece_seconds() == 90
+    assert session.advance() == []
+    session.resume()
+    clock.tick(90)
+    [record] = session.advance()
+    assert record.name == "/piece_0.pdf"
+    assert record.seconds == 120
+    assert record.session == 7
+    assert session.current()["Name"] == "/piece_1.pdf"
+    assert session.remaining_session_seconds() == 180
+
+
+def test_skip_credits_the_time_played_and_drops_the_rest_from_the_session():
+    session, clock = session_with(5, 5)
+    clock.tick(70)
+    [record] = session.skip()
+    assert record.name == "/piece_0.pdf"
+    assert practiced_minutes(record.seconds) == 2
+    assert session.remaining_piece_seconds() == 300
+    assert session.remaining_session_seconds() == 300
+    clock.tick(300)
+    [record] = session.skip()
+    assert record.seconds == 300
+    assert session.finished
+    assert session.paused
+
+
+def test_stall_closes_every_piece_that_ran_out():
+    # A blocked event loop only delays advance(); each piece still gets exactly its planned time
+    session, clock = session_with(1, 1, 4)
+    clock.tick(150)
+    records = session.advance()
+    assert [record.name for record in records] == ["/piece_0.pdf", "/piece_1.pdf"]
+    assert [record.seconds for record in records] == [60, 60]
+    assert session.remaining_piece_seconds() == 210
+    clock.tick(3600)
+    [record] = session.advance()
+    assert record.seconds == 240
+    assert session.finished
+    assert session.remaining_session_seconds() == 0
+
+
+def test_stall_before_a_skip_closes_the_finished_pieces_first():
+    session, clock = session_with(1, 3)
+    clock.tick(90)
+    records = session.skip()
+    assert [(record.name, record.seconds) for record in records] == [("/piece_0.pdf", 60), ("/piece_1.pdf", 30)]
+    assert session.finished
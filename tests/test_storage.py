@@ -0,0 +1,119 @@
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+from music_study import PieceStore, ValidationReport, open_storage
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# A reduced benchmarks/concurrency.py writer, run as its own process so it can die mid compaction.
+# argv: folder, backend, number, saves, crash ("", "before_replace" or "before_remove"). Prints the
+# minutes it saved and the pieces it added before its last compaction.
+WRITER = """
+import json, os, random, sys
+from music_study import PieceStore, ValidationReport, open_storage
+
+folder, backend, number, saves, crash = sys.argv[1:]
+number, saves = int(number), int(saves)
+rng = random.Random(number)
+storage = open_storage(1, folder, backend)
+data = PieceStore()
+storage.load(data, ValidationReport())
+minutes = 0
+added = []
+for save in range(saves):
+    if number % 2:
+        storage = open_storage(1, folder, backend)
+        data = PieceStore()
+        storage.load(data, ValidationReport())
+    for _ in range(3):
+        practiced = rng.randint(1, 30)
+        data.record_practice(rng.randrange(len(data)), practiced)
+        minutes += practiced
+    if save % 5 == 0:
+        added.append(f"writer_{number}/piece_{save}.pdf")
+        data.append(added[-1])
+    storage.save(data)
+    if number == 0 and save % 4 == 2:
+        storage.compact(data)
+print(json.dumps({"minutes": minutes, "added": added}), flush=True)
+
+replace, remove = os.replace, os.remove
+
+def crashing_replace(source, target):
+    if crash == "before_replace" and target == storage.file_path:
+        os._exit(3)
+    replace(source, target)
+
+def crashing_remove(path):
+    if crash == "before_remove" and path == storage.compacting_path:
+        os._exit(3)
+    remove(path)
+
+os.replace, os.remove = crashing_replace, crashing_remove
+storage.compact(data)
+"""
+
+
+def seed_tab(folder, backend, pieces):
+    data = PieceStore()
+    storage = open_storage(1, folder, backend)
+    storage.load(data, ValidationReport())
+    for i in range(pieces):
+        data.append(f"shared/piece_{i}.pdf")
+    storage.save(data)
+
+
+def start_writer(folder, backend, number, saves, crash=""):
+    return subprocess.Popen([sys.executable, "-c", WRITER, folder, backend, str(number), str(saves), crash],
+                            stdout=subprocess.PIPE, text=True, env={**os.environ, "PYTHONPATH": REPO})
+
+
+def finish_writer(process, crash=""):
+    output, _ = process.communicate(timeout=60)
+    assert process.returncode == (3 if crash else 0)
+    return json.loads(output)
+
+
+def load_tab(folder, backend):
+    data = PieceStore()
+    open_storage(1, folder, backend).load(data, ValidationReport())
+    return data
+
+
+@pytest.mark.parametrize("crash", ["before_replace", "before_remove"])
+def test_compaction_killed_midway_does_not_double_count(tmp_path, crash):
+    folder = str(tmp_path)
+    seed_tab(folder, "csv", 5)
+    result = finish_writer(start_writer(folder, "csv", 1, 2, crash), crash)
+    data = load_tab(folder, "csv")
+    assert sum(data.minutes) == result["minutes"]
+    # The recovered tab compacts cleanly and still holds every minute
+    open_storage(1, folder, "csv").compact(data)
+    assert sum(load_tab(folder, "csv").minutes) == result["minutes"]
+    assert not os.path.exists(os.path.join(folder, "data_1.journal.compacting"))
+
+
+@pytest.mark.parametrize("backend", ["csv", "snapshot", "sqlite"])
+def test_concurrent_writers_lose_nothing(tmp_path, backend):
+    folder = str(tmp_path)
+    seed_tab(folder, backend, 50)
+    writers = [start_writer(folder, backend, number, 20) for number in range(4)]
+    results = [finish_writer(process) for process in writers]
+    data = load_tab(folder, backend)
+    assert sum(data.minutes) == sum(result["minutes"] for result in results)
+    assert all(name in data for result in results for name in result["added"])
+
+
+def test_concurrent_writers_survive_a_crash_during_compaction(tmp_path):
+    folder = str(tmp_path)
+    seed_tab(folder, "csv", 50)
+    crashing = start_writer(folder, "csv", 0, 20, "before_remove")
+    writers = [start_writer(folder, "csv", number, 20) for number in range(1, 4)]
+    results = [finish_writer(crashing, "before_remove")] + [finish_writer(process) for process in writers]
+    data = load_tab(folder, "csv")
+    assert sum(data.minutes) == sum(result["minutes"] for result in results)
+    assert all(name in data for result in results for name in result["added"])